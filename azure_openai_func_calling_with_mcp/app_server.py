@@ -1,19 +1,90 @@
-import arxiv
-import json
 import os
-from typing import List
-from mcp.server.fastmcp import FastMCP
+import json
+import time
+import atexit
+import asyncio
+import functools
+from datetime import datetime, timezone
+from typing import Annotated, Dict, List, Optional, Tuple, Union
+from anyio import to_thread
+from pydantic import AnyUrl, Field
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.fastmcp.exceptions import ResourceError
+from arxiv_service import arxiv_service
+from paper_store import get_store, topic_dir_name
+from search_cache import search_cache
+from search_stream import SearchStream, STREAM_FIRST_PAGE
+from local_search import get_local_index
+from semantic_search import get_embedding_index
+from topic_catalog import TopicCatalog
+from topic_render import TopicRenderCache, RESOURCE_PAGE_SIZE
+from tracing import configure as configure_tracing, span
+from metrics import CONTENT_TYPE, REGISTRY, REQUESTS, REQUEST_SECONDS
 
 PAPER_DIR = "papers"
 
+# Upper bounds for one batch tool call
+MAX_BATCH_TOPICS = int(os.getenv("MAX_BATCH_TOPICS", "10"))
+MAX_BATCH_PAPERS = int(os.getenv("MAX_BATCH_PAPERS", "100"))
+
+# Storage backend is picked with the PAPER_STORE env var (json | sqlite)
+store = get_store(PAPER_DIR)
+
+# Rendered papers://{topic} pages, patched in place as new papers are saved
+render_cache = TopicRenderCache(store)
+
+# BM25 index over stored papers, kept up to date on every save
+local_index = get_local_index(store, PAPER_DIR)
+atexit.register(local_index.close)
+
+# Paper embeddings for similarity search, filled by a background worker
+embedding_index = get_embedding_index(store, PAPER_DIR)
+atexit.register(embedding_index.close)
+
+# Topic list with counts for papers://folders, kept up to date on every save
+catalog = TopicCatalog(store)
+
 # Initialize FastMCP server
 mcp = FastMCP("Arxiv Research", port=8001, stateless_http=True)
+configure_tracing("paper-mcp-server")
+
+
+def traced_tool(fn):
+    """
+    Run a tool in a span that continues the caller's trace (traceparent in
+    the request _meta), and count it in the request metrics.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            meta = mcp.get_context().request_context.meta
+        except ValueError:
+            meta = None
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with span(f"mcp.tool {fn.__name__}", traceparent=getattr(meta, "traceparent", None), kind="server"):
+                result = await fn(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            REQUESTS.inc(tool=fn.__name__, status=status)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, tool=fn.__name__)
+    return wrapper
+
 
 @mcp.tool()
-def search_papers(topic: str, max_results: int = 5) -> List[str]:
+@traced_tool
+async def search_papers(topic: str, max_results: int = 5, ctx: Context = None) -> List[str]:
     """
     Search for papers on arXiv based on a topic and store their information.
     
+    For large searches (more than STREAM_FIRST_PAGE results) only the first
+    page of IDs is returned; the remaining pages keep being fetched and stored
+    in the background and show up in papers://{topic} and search_local.
+    
     Args:
         topic: The topic to search for
         max_results: Maximum number of results to retrieve (default: 5)
@@ -21,146 +92,271 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
     Returns:
         List of paper IDs found in the search
     """
-    
-    # Use arxiv to find the papers 
-    client = arxiv.Client()
+    return await _search_one(topic, max_results, ctx)
 
-    # Search for the most relevant articles matching the queried topic
-    search = arxiv.Search(
-        query = topic,
-        max_results = max_results,
-        sort_by = arxiv.SortCriterion.Relevance
-    )
 
-    papers = client.results(search)
+async def _search_one(topic: str, max_results: int, ctx: Optional[Context]) -> List[str]:
+    # Shared by search_papers and search_papers_batch, outside traced_tool so a
+    # batch counts as one tool call in the spans and request metrics
+    etag_before = catalog.etag
+    is_new_topic = topic_dir_name(topic) not in catalog
+    
+    # Serve repeated searches from the shared result cache
+    results = search_cache.get(topic, max_results)
+    if results is None and max_results > STREAM_FIRST_PAGE:
+        # Return as soon as the first page is stored; the rest streams in behind it
+        stream = SearchStream(store, topic, max_results)
+        paper_ids = await stream.first() or []
+        if ctx is not None:
+            await ctx.report_progress(
+                len(paper_ids), max_results,
+                f"Returned the first {len(paper_ids)} papers; fetching the rest in the background",
+            )
+        print(f"First {len(paper_ids)} results are saved for topic: {topic}; more are on the way")
+    else:
+        if results is None:
+            results = await arxiv_service.search_async(topic, max_results)
+            search_cache.put(topic, max_results, results)
+        
+        papers_info = dict(results)
+        paper_ids = [paper_id for paper_id, _ in results]
+        
+        # Upsert into the paper store off the event loop
+        await to_thread.run_sync(store.save_papers, topic, papers_info)
+        
+        print(f"Results are saved for topic: {topic}")
     
-    # Create directory for this topic
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
+    # Tell the client about catalog changes only when there was one
+    if ctx is not None and catalog.etag != etag_before:
+        await ctx.session.send_resource_updated(AnyUrl("papers://folders"))
+        if is_new_topic:
+            await ctx.session.send_resource_list_changed()
     
-    file_path = os.path.join(path, "papers_info.json")
+    return paper_ids
 
-    # Try to load existing papers info
-    try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        papers_info = {}
-
-    # Process each paper and add to papers_info  
-    paper_ids = []
-    for paper in papers:
-        paper_ids.append(paper.get_short_id())
-        paper_info = {
-            'title': paper.title,
-            'authors': [author.name for author in paper.authors],
-            'summary': paper.summary,
-            'pdf_url': paper.pdf_url,
-            'published': str(paper.published.date())
+def describe_hits(hits: List[Tuple[str, float]]) -> List[dict]:
+    papers = store.get_papers([paper_id for paper_id, _ in hits])
+    return [
+        {
+            "paper_id": paper_id,
+            "title": papers[paper_id]["title"],
+            "published": papers[paper_id]["published"],
+            "score": round(score, 3),
         }
-        papers_info[paper.get_short_id()] = paper_info
+        for paper_id, score in hits
+        if paper_id in papers
+    ]
+
+@mcp.tool()
+@traced_tool
+async def search_local(query: str, limit: int = 10) -> str:
+    """
+    Full-text search over papers that are already stored, without calling arXiv.
+    
+    Args:
+        query: Keywords to look for in titles, summaries and author names
+        limit: Maximum number of papers to return (default: 10)
+        
+    Returns:
+        JSON list of matching papers (paper_id, title, published, score), best match first
+    """
+    def run():
+        return describe_hits(local_index.search(query, limit))
     
-    # Save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    return json.dumps(await to_thread.run_sync(run), separators=(",", ":"))
+
+@mcp.tool()
+@traced_tool
+async def search_similar(query: str = "", paper_id: str = "", limit: int = 10) -> str:
+    """
+    Find stored papers similar to a piece of text or to a stored paper.
     
-    print(f"Results are saved in: {file_path}")
+    Similarity is lexical (shared words) with the default hashing embedder and
+    semantic with EMBEDDER=sentence-transformers.
     
-    return paper_ids
+    Args:
+        query: Text to compare against (e.g. a description or an abstract)
+        paper_id: ID of a stored paper to find neighbours of (used instead of query if given)
+        limit: Maximum number of papers to return (default: 10)
+        
+    Returns:
+        JSON list of similar papers (paper_id, title, published, score), most similar first
+    """
+    def run():
+        if paper_id:
+            hits = embedding_index.similar_to_paper(paper_id, limit)
+            if hits is None:
+                return {"error": f"Paper {paper_id} is not stored or not embedded yet"}
+        elif query:
+            hits = embedding_index.similar_to_text(query, limit)
+        else:
+            return {"error": "Provide either a query or a paper_id"}
+        return describe_hits(hits)
+    
+    return json.dumps(await to_thread.run_sync(run), separators=(",", ":"))
+
+def missing_paper(paper_id: str) -> dict:
+    return {"error": f"There's no saved information related to paper {paper_id}."}
 
 @mcp.tool()
-def extract_info(paper_id: str) -> str:
+@traced_tool
+async def extract_info(paper_id: str) -> str:
     """
-    Search for information about a specific paper across all topic directories.
+    Look up information about a specific paper in the paper store.
     
     Args:
         paper_id: The ID of the paper to look for
         
     Returns:
-        JSON string with paper information if found, error message if not found
+        JSON string with paper information if found, {"error": ...} if not found
     """
  
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
-    
-    return f"There's no saved information related to paper {paper_id}."
+    paper_info = await to_thread.run_sync(store.get_paper, paper_id)
+    return json.dumps(paper_info if paper_info is not None else missing_paper(paper_id), separators=(",", ":"))
+
 
+@mcp.tool()
+@traced_tool
+async def search_papers_batch(
+    topics: Annotated[List[str], Field(min_length=1, max_length=MAX_BATCH_TOPICS)],
+    max_results: int = 5,
+    ctx: Context = None,
+) -> Dict[str, Union[List[str], Dict[str, str]]]:
+    """
+    Search arXiv for several topics at once and store the papers found.
+    
+    Args:
+        topics: The topics to search for (at most MAX_BATCH_TOPICS)
+        max_results: Maximum number of results to retrieve per topic (default: 5)
+        
+    Returns:
+        Mapping of each topic to the list of paper IDs found for it, or to
+        {"error": ...} if that topic's search failed
+    """
+    topics = list(dict.fromkeys(topics))
+    # Topics are fetched concurrently; they still share the arXiv rate limit.
+    # One failing topic must not sink the others.
+    results = await asyncio.gather(*(_search_one(topic, max_results, ctx) for topic in topics),
+                                   return_exceptions=True)
+    return {
+        topic: {"error": str(result)} if isinstance(result, BaseException) else result
+        for topic, result in zip(topics, results)
+    }
 
+@mcp.tool()
+@traced_tool
+async def extract_info_batch(
+    paper_ids: Annotated[List[str], Field(min_length=1, max_length=MAX_BATCH_PAPERS)],
+) -> str:
+    """
+    Look up information about several papers in the paper store in one call.
+    
+    Args:
+        paper_ids: The IDs of the papers to look for (at most MAX_BATCH_PAPERS)
+        
+    Returns:
+        JSON object mapping each paper ID to its information, or to {"error": ...} if not found
+    """
+    papers = await to_thread.run_sync(store.get_papers, list(dict.fromkeys(paper_ids)))
+    return json.dumps({
+        paper_id: papers[paper_id] if paper_id in papers else missing_paper(paper_id)
+        for paper_id in paper_ids
+    }, separators=(",", ":"))
 
 @mcp.resource("papers://folders")
-def get_available_folders() -> str:
+async def get_available_folders() -> str:
     """
     List all available topic folders in the papers directory.
     
     This resource provides a simple list of all available topic folders.
     """
-    folders = []
-    
-    # Get all topic directories
-    if os.path.exists(PAPER_DIR):
-        for topic_dir in os.listdir(PAPER_DIR):
-            topic_path = os.path.join(PAPER_DIR, topic_dir)
-            if os.path.isdir(topic_path):
-                papers_file = os.path.join(topic_path, "papers_info.json")
-                if os.path.exists(papers_file):
-                    folders.append(topic_dir)
+    etag, topics = await to_thread.run_sync(catalog.snapshot)
     
     # Create a simple markdown list
     content = "# Available Topics\n\n"
-    if folders:
-        for folder in folders:
-            content += f"- {folder}\n"
+    if topics:
+        for folder in sorted(topics):
+            entry = topics[folder]
+            updated = datetime.fromtimestamp(entry.updated, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+            content += f"- {folder} ({entry.count} papers, updated {updated})\n"
         content += f"\nUse @{folder} to access papers in that topic.\n"
     else:
         content += "No topics found.\n"
+    content += f"\nCatalog version: {etag}\n"
     
     return content
 
+@mcp.custom_route("/catalog", methods=["GET"])
+async def get_catalog(request: Request) -> Response:
+    """Topic catalog as JSON, with ETag / If-None-Match support for cheap polling."""
+    etag, topics = await to_thread.run_sync(catalog.snapshot)
+    headers = {"ETag": f'"{etag}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(
+        {
+            "etag": etag,
+            "topics": [
+                {"topic": topic, "count": entry.count, "updated": entry.updated}
+                for topic, entry in sorted(topics.items())
+            ],
+        },
+        headers=headers,
+    )
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def get_metrics(request: Request) -> Response:
+    """Prometheus text-format metrics (tool, arXiv, cache, store and threadpool)."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def render_topic_page(topic: str, cursor: int) -> str:
+    try:
+        page = render_cache.get_page(topic, cursor)
+    except json.JSONDecodeError:
+        return f"# Error reading papers data for {topic}\n\nThe papers data file is corrupted."
+    
+    if page is None:
+        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
+    
+    body, total, next_cursor = page
+    # Create markdown content with paper details
+    parts = [
+        f"# Papers on {topic.replace('_', ' ').title()}\n\n",
+        f"Total papers: {total}\n\n",
+    ]
+    if total > RESOURCE_PAGE_SIZE:
+        parts.append(f"Showing papers {min(cursor + 1, total)}-{min(cursor + RESOURCE_PAGE_SIZE, total)}\n\n")
+    parts.append(body)
+    if next_cursor is not None:
+        parts.append(f"Next page: papers://{topic}/page/{next_cursor}\n")
+    return "".join(parts)
+
 @mcp.resource("papers://{topic}")
-def get_topic_papers(topic: str) -> str:
+async def get_topic_papers(topic: str) -> str:
     """
-    Get detailed information about papers on a specific topic.
+    Get detailed information about papers on a specific topic (first page).
     
     Args:
         topic: The research topic to retrieve papers for
     """
-    topic_dir = topic.lower().replace(" ", "_")
-    papers_file = os.path.join(PAPER_DIR, topic_dir, "papers_info.json")
-    
-    if not os.path.exists(papers_file):
-        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
+    return await to_thread.run_sync(render_topic_page, topic, 0)
+
+@mcp.resource("papers://{topic}/page/{cursor}")
+async def get_topic_papers_page(topic: str, cursor: str) -> str:
+    """
+    Get one page of papers on a specific topic, starting at `cursor`.
     
+    Args:
+        topic: The research topic to retrieve papers for
+        cursor: Offset of the first paper on the page (from the previous page's "Next page" link)
+    """
     try:
-        with open(papers_file, 'r') as f:
-            papers_data = json.load(f)
-        
-        # Create markdown content with paper details
-        content = f"# Papers on {topic.replace('_', ' ').title()}\n\n"
-        content += f"Total papers: {len(papers_data)}\n\n"
-        
-        for paper_id, paper_info in papers_data.items():
-            content += f"## {paper_info['title']}\n"
-            content += f"- **Paper ID**: {paper_id}\n"
-            content += f"- **Authors**: {', '.join(paper_info['authors'])}\n"
-            content += f"- **Published**: {paper_info['published']}\n"
-            content += f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
-            content += f"### Summary\n{paper_info['summary'][:500]}...\n\n"
-            content += "---\n\n"
-        
-        return content
-    except json.JSONDecodeError:
-        return f"# Error reading papers data for {topic}\n\nThe papers data file is corrupted."
+        offset = int(cursor)
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        raise ResourceError(f"Invalid cursor {cursor!r}: expected a non-negative paper offset")
+    return await to_thread.run_sync(render_topic_page, topic, offset)
 
 @mcp.prompt()
 def generate_search_prompt(topic: str, num_papers: int = 5) -> str:
@@ -0,0 +1,141 @@
+import sys
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class ToolCallFunction:
+    name: str = ""
+    arguments: str = ""
+
+
+@dataclass
+class StreamedToolCall:
+    """A tool call rebuilt from streamed fragments (same attributes as the SDK object)."""
+    id: str = ""
+    function: ToolCallFunction = field(default_factory=ToolCallFunction)
+    type: str = "function"
+    index: int = 0  # position in the assistant message (ids are not guaranteed unique)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "type": self.type,
+            "function": {"name": self.function.name, "arguments": self.function.arguments},
+        }
+
+
+@dataclass
+class StreamedTurn:
+    content: str = ""
+    tool_calls: List[StreamedToolCall] = field(default_factory=list)
+    ttft: Optional[float] = None  # seconds until the first content or tool-call delta
+    completion_tokens: int = 0
+    tokens_per_sec: float = 0.0
+
+
+def _arguments_complete(arguments: str) -> bool:
+    if not arguments.rstrip().endswith("}"):
+        return False
+    try:
+        json.loads(arguments)
+        return True
+    except ValueError:
+        return False
+
+
+class StreamPrinter:
+    """Print content deltas as they arrive, with the bot prefix before the first one."""
+
+    def __init__(self, prefix: str = "🤖 Bot: "):
+        self.prefix = prefix
+        self.started = False
+
+    def __call__(self, text: str):
+        if not self.started:
+            sys.stdout.write(self.prefix)
+            self.started = True
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def finish(self):
+        if self.started:
+            sys.stdout.write("\n\n")
+            sys.stdout.flush()
+
+
+def stream_completion(client, on_text: Callable[[str], None],
+                      on_tool_call: Optional[Callable[[StreamedToolCall], None]] = None,
+                      **create_kwargs) -> StreamedTurn:
+    """
+    Run a streaming chat completion.
+
+    Content deltas go to `on_text` as they arrive. Tool-call argument
+    fragments are merged per index, and `on_tool_call` fires as soon as a
+    call's arguments form complete JSON, so tools can start while the model
+    is still streaming the remaining calls.
+    """
+    turn = StreamedTurn()
+    content_parts = []
+    calls: Dict[int, StreamedToolCall] = {}
+    dispatched = set()
+    content_chunks = 0
+
+    def dispatch(index: int):
+        if on_tool_call is not None and index not in dispatched:
+            dispatched.add(index)
+            on_tool_call(calls[index])
+
+    started = time.perf_counter()
+    first_token_at = None
+    stream = client.chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **create_kwargs
+    )
+
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            turn.completion_tokens = chunk.usage.completion_tokens
+        # Azure sends a leading chunk with prompt filter results and no choices
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            content_parts.append(delta.content)
+            content_chunks += 1
+            on_text(delta.content)
+
+        for fragment in delta.tool_calls or []:
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            call = calls.setdefault(fragment.index, StreamedToolCall(index=fragment.index))
+            if fragment.id:
+                call.id = fragment.id
+            if fragment.function is not None:
+                if fragment.function.name:
+                    call.function.name += fragment.function.name
+                if fragment.function.arguments:
+                    call.function.arguments += fragment.function.arguments
+            if call.id and call.function.name and _arguments_complete(call.function.arguments):
+                dispatch(fragment.index)
+
+    finished = time.perf_counter()
+    for index in sorted(calls):
+        dispatch(index)
+
+    turn.content = "".join(content_parts)
+    turn.tool_calls = [calls[index] for index in sorted(calls)]
+    if first_token_at is not None:
+        turn.ttft = first_token_at - started
+        if not turn.completion_tokens:
+            turn.completion_tokens = content_chunks
+        generation_time = finished - first_token_at
+        if generation_time > 0:
+            turn.tokens_per_sec = turn.completion_tokens / generation_time
+    return turn
@@ -0,0 +1,179 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional
+
+# Prompt tokens the message history may use (the tool schemas come on top)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+# Most recent user turns that are never compacted or dropped
+KEEP_RECENT_TURNS = int(os.getenv("KEEP_RECENT_TURNS", "2"))
+# Older tool results above this size are replaced by a reference
+COMPACT_TOOL_RESULT_TOKENS = int(os.getenv("COMPACT_TOOL_RESULT_TOKENS", "200"))
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "gpt-4o")
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators the API adds per message
+MAX_REFERENCE_IDS = 20
+
+_PAPER_ID = re.compile(r"\b\d{4}\.\d{4,5}(?:v\d+)?\b")
+
+
+def get_token_counter(model: str = TOKENIZER_MODEL) -> Callable[[str], int]:
+    """tiktoken when it is installed, otherwise the usual ~4 characters per token estimate."""
+    try:
+        import tiktoken
+    except ImportError:
+        return lambda text: (len(text) + 3) // 4
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _tool_call_parts(tool_call) -> List[str]:
+    # Dicts from the streaming path, SDK objects from the blocking one
+    if isinstance(tool_call, dict):
+        function = tool_call.get("function", {})
+        return [function.get("name", ""), function.get("arguments", "")]
+    return [tool_call.function.name, tool_call.function.arguments]
+
+
+class ConversationMemory:
+    """
+    Chat history kept under a prompt-token budget.
+
+    Each message is counted once, when it is appended, so checking the
+    budget is O(1). When the history goes over budget, fit() first replaces
+    large tool results from older turns with a short reference (the tool
+    name and the paper IDs it returned, which extract_info can fetch again),
+    oldest first. If that is not enough, whole old turns are dropped. The
+    system prompt and the last KEEP_RECENT_TURNS user turns are always kept
+    verbatim.
+    """
+
+    def __init__(self, system_prompt: str, budget: int = CONTEXT_TOKEN_BUDGET,
+                 keep_recent_turns: int = KEEP_RECENT_TURNS,
+                 compact_threshold: int = COMPACT_TOOL_RESULT_TOKENS,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.budget = budget
+        self.keep_recent_turns = keep_recent_turns
+        self.compact_threshold = compact_threshold
+        self.count_tokens = count_tokens or get_token_counter()
+        self.messages: List[dict] = []
+        self._counts: List[int] = []
+        self._compacted: List[bool] = []  # tool results already replaced by a reference
+        self.tokens = 0
+        self.dropped_turns = 0
+        self.append({"role": "system", "content": system_prompt})
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def _count(self, message: dict) -> int:
+        parts = [message.get("content") or "", message.get("name") or ""]
+        for tool_call in message.get("tool_calls") or []:
+            parts.extend(_tool_call_parts(tool_call))
+        return MESSAGE_OVERHEAD_TOKENS + sum(self.count_tokens(part) for part in parts if part)
+
+    def append(self, message: dict):
+        self._insert(len(self.messages), message)
+
+    def _insert(self, index: int, message: dict):
+        count = self._count(message)
+        self.messages.insert(index, message)
+        self._counts.insert(index, count)
+        self._compacted.insert(index, False)
+        self.tokens += count
+
+    def _replace(self, index: int, message: dict):
+        count = self._count(message)
+        self.tokens += count - self._counts[index]
+        self.messages[index] = message
+        self._counts[index] = count
+
+    def _recent_start(self) -> int:
+        """Index of the first message that belongs to the recent, verbatim turns."""
+        user_turns = [i for i, message in enumerate(self.messages) if message["role"] == "user"]
+        if len(user_turns) <= self.keep_recent_turns:
+            return 1 if not user_turns else user_turns[0]
+        return user_turns[-self.keep_recent_turns] if self.keep_recent_turns else len(self.messages)
+
+    def _reference(self, message: dict, tokens: int) -> dict:
+        name = message.get("name", "tool")
+        paper_ids = list(dict.fromkeys(_PAPER_ID.findall(message.get("content") or "")))
+        if paper_ids:
+            listed = ", ".join(paper_ids[:MAX_REFERENCE_IDS])
+            if len(paper_ids) > MAX_REFERENCE_IDS:
+                listed += f" and {len(paper_ids) - MAX_REFERENCE_IDS} more"
+            content = (f"[Earlier {name} result ({tokens} tokens) removed to save context. "
+                       f"Paper IDs: {listed}. Call extract_info with a paper ID to fetch its details again.]")
+        else:
+            content = (f"[Earlier {name} result ({tokens} tokens) removed to save context. "
+                       f"Call {name} again if it is needed.]")
+        return dict(message, content=content)
+
+    def _compact_tool_results(self, stop: int):
+        for index in range(1, stop):
+            if self.tokens <= self.budget:
+                return
+            message = self.messages[index]
+            if message["role"] != "tool" or self._compacted[index] \
+                    or self._counts[index] <= self.compact_threshold:
+                continue
+            self._replace(index, self._reference(message, self._counts[index]))
+            self._compacted[index] = True
+
+    def _drop_old_turns(self, stop: int):
+        # Whole turns go together, so no tool result outlives its assistant tool call
+        start = 1
+        if self.dropped_turns:
+            start = 2  # keep the "turns dropped" note right after the system prompt
+        end = start
+        freed = 0
+        dropped = 0
+        while end < stop and self.tokens - freed > self.budget:
+            freed += self._counts[end]
+            end += 1
+            while end < stop and self.messages[end]["role"] != "user":
+                freed += self._counts[end]
+                end += 1
+            dropped += 1
+        if not dropped:
+            return
+        self.tokens -= freed
+        del self.messages[start:end]
+        del self._counts[start:end]
+        del self._compacted[start:end]
+        self.dropped_turns += dropped
+
+        note = {
+            "role": "system",
+            "content": (f"[{self.dropped_turns} earlier turns were dropped to stay within the context budget. "
+                        f"Papers found in them are still stored; use search_local or extract_info to look them up.]"),
+        }
+        if start == 2:
+            self._replace(1, note)
+        else:
+            self._insert(1, note)
+
+    def fit(self) -> int:
+        """
+        Bring the history under budget before a request.
+
+        Returns:
+            The number of tokens saved (0 if the history already fit)
+        """
+        before = self.tokens
+        if self.tokens > self.budget:
+            self._compact_tool_results(self._recent_start())
+        if self.tokens > self.budget:
+            self._drop_old_turns(self._recent_start())
+        return before - self.tokens
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "messages": len(self.messages),
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "compacted_results": sum(self._compacted),
+            "dropped_turns": self.dropped_turns,
+        }
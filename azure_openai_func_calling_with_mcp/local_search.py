@@ -0,0 +1,327 @@
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import hashlib
+import logging
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from paper_store import PaperStore
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Fold the in-memory delta into the on-disk segment once it holds this many papers
+LOCAL_INDEX_MERGE_DOCS = int(os.getenv("LOCAL_INDEX_MERGE_DOCS", "500"))
+
+SEGMENT_FILE = "segment.bin"
+_HEADER = 8  # little header: length of the JSON metadata block
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "we with which our can".split()
+)
+
+Postings = List[Tuple[int, int]]  # [(doc slot, term frequency)]
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def paper_text(paper_info: dict) -> str:
+    return " ".join([
+        paper_info.get("title", ""),
+        paper_info.get("summary", ""),
+        " ".join(paper_info.get("authors", [])),
+    ])
+
+
+def _fingerprint(paper_info: dict) -> str:
+    return hashlib.sha1(paper_text(paper_info).encode("utf-8")).hexdigest()[:16]
+
+
+def _json_version(version) -> object:
+    # Tuples come back from JSON as lists; compare versions in their JSON form
+    return json.loads(json.dumps(version))
+
+
+class _Segment:
+    """Read-only posting lists in one memory-mapped file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        meta_len = int.from_bytes(self._mmap[:_HEADER], "little")
+        self.meta = json.loads(self._mmap[_HEADER:_HEADER + meta_len])
+        self.terms: Dict[str, List[int]] = self.meta.pop("terms")
+        start = _HEADER + meta_len
+        self._view = memoryview(self._mmap)[start:].cast("I")
+
+    def postings(self, term: str) -> Postings:
+        entry = self.terms.get(term)
+        if entry is None:
+            return []
+        offset, df = entry
+        flat = self._view[2 * offset:2 * (offset + df)]
+        return list(zip(flat[0::2], flat[1::2]))
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    @staticmethod
+    def write(path: str, meta: dict, postings: Dict[str, Postings]):
+        flat = array("I")
+        terms = {}
+        for term in sorted(postings):
+            plist = postings[term]
+            terms[term] = [len(flat) // 2, len(plist)]
+            for slot, tf in plist:
+                flat.append(slot)
+                flat.append(tf)
+        meta_bytes = json.dumps(dict(meta, terms=terms), separators=(",", ":")).encode("utf-8")
+        # Keep the posting array 8-byte aligned
+        meta_bytes += b" " * (-len(meta_bytes) % 8)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(len(meta_bytes).to_bytes(_HEADER, "little"))
+            f.write(meta_bytes)
+            flat.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class LocalSearchIndex:
+    """
+    BM25 full-text index over the title, summary and authors of stored papers.
+
+    Posting lists live in a memory-mapped segment file under `index_dir`.
+    Papers saved since the last merge sit in an in-memory delta, which a
+    background thread folds into a new segment every LOCAL_INDEX_MERGE_DOCS
+    papers. Each paper gets a doc slot; re-saving a paper with changed text
+    tombstones its old slot, and the next merge drops tombstoned slots and
+    renumbers the rest.
+
+    The index registers itself as a store listener, so every save_papers()
+    is indexed as it happens. On startup, topics whose store version differs
+    from the one recorded in the segment are re-read to catch up.
+    """
+
+    def __init__(self, store: PaperStore, index_dir: str):
+        self.store = store
+        self.index_dir = index_dir
+        self.segment_path = os.path.join(index_dir, SEGMENT_FILE)
+        self._lock = threading.RLock()
+        self._merge_lock = threading.Lock()
+        self._merge_thread: Optional[threading.Thread] = None
+
+        self._segment: Optional[_Segment] = None
+        self._docs: List[Optional[Tuple[str, int]]] = []  # slot -> (paper_id, length) or None if tombstoned
+        self._slots: Dict[str, int] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._tombstones = set()
+        self._new_tombstones = 0
+        self._total_length = 0
+        self._topic_versions: Dict[str, object] = {}
+        self._frozen: Dict[str, Postings] = {}  # delta being merged
+        self._delta: Dict[str, Postings] = {}
+        self._delta_docs = 0
+
+        self._load()
+        store.add_listener(self._on_save)
+
+    def _load(self):
+        if not os.path.exists(self.segment_path):
+            return
+        try:
+            segment = _Segment(self.segment_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable search segment %s: %s", self.segment_path, e)
+            return
+        meta = segment.meta
+        self._segment = segment
+        self._docs = [tuple(doc) if doc else None for doc in meta["docs"]]
+        self._tombstones = {slot for slot, doc in enumerate(self._docs) if doc is None}
+        self._slots = {doc[0]: slot for slot, doc in enumerate(self._docs) if doc}
+        self._fingerprints = meta["fingerprints"]
+        self._topic_versions = meta["topic_versions"]
+        self._total_length = sum(doc[1] for doc in self._docs if doc)
+        logger.info("Loaded search segment: %d papers, %d terms", len(self._slots), len(segment.terms))
+
+    def sync(self):
+        """Index papers from topics that changed since the segment was written."""
+        for topic in self.store.list_topics():
+            version = self.store.topic_version(topic)
+            if version is None or _json_version(version) == self._topic_versions.get(topic):
+                continue
+            try:
+                papers = self.store.get_topic_papers(topic)
+            except ValueError as e:
+                logger.warning("Skipping unreadable topic %s while indexing: %s", topic, e)
+                continue
+            self.add_papers(papers, topic, version)
+
+    def _on_save(self, topic: str, papers: Dict[str, dict]):
+        self.add_papers(papers, topic, self.store.topic_version(topic))
+
+    def add_papers(self, papers: Dict[str, dict], topic: Optional[str] = None, version=None):
+        """Index new or changed papers (unchanged ones are skipped)."""
+        with self._lock:
+            for paper_id, paper_info in papers.items():
+                fingerprint = _fingerprint(paper_info)
+                if self._fingerprints.get(paper_id) == fingerprint:
+                    continue
+                old_slot = self._slots.get(paper_id)
+                if old_slot is not None:
+                    self._total_length -= self._docs[old_slot][1]
+                    self._docs[old_slot] = None
+                    self._tombstones.add(old_slot)
+                    self._new_tombstones += 1
+
+                tokens = tokenize(paper_text(paper_info))
+                slot = len(self._docs)
+                self._docs.append((paper_id, len(tokens)))
+                self._slots[paper_id] = slot
+                self._fingerprints[paper_id] = fingerprint
+                self._total_length += len(tokens)
+                for term, tf in Counter(tokens).items():
+                    self._delta.setdefault(term, []).append((slot, tf))
+                self._delta_docs += 1
+            if topic is not None and version is not None:
+                self._topic_versions[topic] = _json_version(version)
+            if self._delta_docs >= LOCAL_INDEX_MERGE_DOCS:
+                self._start_merge()
+
+    def _start_merge(self):
+        if self._merge_thread is not None and self._merge_thread.is_alive():
+            return
+        self._merge_thread = threading.Thread(target=self.merge, name="search-merge", daemon=True)
+        self._merge_thread.start()
+
+    def merge(self):
+        """Write the segment plus the current delta (minus tombstoned papers) as a new segment."""
+        with self._merge_lock:
+            with self._lock:
+                if not self._delta and not self._new_tombstones:
+                    return
+                self._frozen, self._delta = self._delta, {}
+                self._delta_docs = 0
+                self._new_tombstones = 0
+                segment = self._segment
+                frozen = self._frozen
+                merged = len(self._docs)
+                # Live slots are packed to the front; tombstoned ones are reclaimed
+                remap = {}
+                for slot, doc in enumerate(self._docs):
+                    if doc is not None:
+                        remap[slot] = len(remap)
+                meta = {
+                    "docs": [self._docs[slot] for slot in remap],
+                    "fingerprints": dict(self._fingerprints),
+                    "topic_versions": dict(self._topic_versions),
+                }
+            self._write_merged(segment, frozen, remap, merged, meta)
+
+    def _write_merged(self, segment: Optional[_Segment], frozen: Dict[str, Postings], remap: Dict[int, int],
+                      merged: int, meta: dict):
+        # Built outside the index lock: searches keep using segment + frozen + delta meanwhile
+        postings: Dict[str, Postings] = {}
+        if segment is not None:
+            for term in segment.terms:
+                plist = [(remap[slot], tf) for slot, tf in segment.postings(term) if slot in remap]
+                if plist:
+                    postings[term] = plist
+        for term, plist in frozen.items():
+            plist = [(remap[slot], tf) for slot, tf in plist if slot in remap]
+            if plist:
+                postings.setdefault(term, []).extend(plist)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        _Segment.write(self.segment_path, meta, postings)
+        new_segment = _Segment(self.segment_path)
+
+        with self._lock:
+            old, self._segment = self._segment, new_segment
+            self._frozen = {}
+            self._renumber(remap, merged)
+        if old is not None:
+            old.close()
+        logger.info("Merged search segment: %d terms, %d papers", len(postings), len(self._slots))
+
+    def _renumber(self, remap: Dict[int, int], merged: int):
+        """Move in-memory state onto the slots of a freshly merged segment."""
+        shift = merged - len(remap)
+        if not shift:
+            return
+
+        def new_slot(slot: int) -> int:
+            return remap[slot] if slot < merged else slot - shift
+
+        # Slots up to `merged` were live when the merge started; later saves may have tombstoned some
+        self._docs = [self._docs[slot] for slot in remap] + self._docs[merged:]
+        self._tombstones = {new_slot(slot) for slot in self._tombstones if slot >= merged or slot in remap}
+        self._slots = {paper_id: new_slot(slot) for paper_id, slot in self._slots.items()}
+        # The delta only holds papers added after the merge started
+        self._delta = {term: [(slot - shift, tf) for slot, tf in plist] for term, plist in self._delta.items()}
+
+    def _postings(self, term: str) -> Postings:
+        plist = self._segment.postings(term) if self._segment is not None else []
+        return plist + self._frozen.get(term, []) + self._delta.get(term, [])
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Rank stored papers against `query` with BM25.
+
+        Returns:
+            Up to `limit` (paper_id, score) pairs, best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            num_docs = len(self._slots)
+            if num_docs == 0:
+                return []
+            avg_length = self._total_length / num_docs
+            scores: Dict[int, float] = {}
+            for term in terms:
+                plist = [p for p in self._postings(term) if p[0] not in self._tombstones]
+                if not plist:
+                    continue
+                df = len(plist)
+                idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+                for slot, tf in plist:
+                    length = self._docs[slot][1]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[slot] = scores.get(slot, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [(self._docs[slot][0], score) for slot, score in best]
+
+    def close(self):
+        if self._merge_thread is not None:
+            self._merge_thread.join()
+        if self._delta:
+            self.merge()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+def get_local_index(store: PaperStore, paper_dir: str) -> LocalSearchIndex:
+    """
+    Build the local search index for a store (kept under LOCAL_INDEX_DIR,
+    default `<paper_dir>/.search_index`) and catch it up with the store.
+    """
+    index = LocalSearchIndex(store, os.getenv("LOCAL_INDEX_DIR", os.path.join(paper_dir, ".search_index")))
+    index.sync()
+    return index
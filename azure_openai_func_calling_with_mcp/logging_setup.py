@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import reprlib
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional, Tuple
+from tracing import current_span
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" writes one JSON object per line; "text" keeps the classic one-line format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Longer messages are cut, with a marker saying how much was dropped
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+# Keep 1 in N payload records (those logged with clip()) per call site
+LOG_PAYLOAD_SAMPLE_EVERY = max(1, int(os.getenv("LOG_PAYLOAD_SAMPLE_EVERY", "1")))
+# Records waiting for the writer thread; when full, new records are dropped rather than blocking
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(asctime)s — %(levelname)s — %(name)s — %(message)s"
+TEXT_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+_repr = reprlib.Repr()
+_repr.maxstring = 200
+_repr.maxother = 200
+_repr.maxlist = _repr.maxtuple = _repr.maxset = 10
+_repr.maxdict = 10
+_repr.maxlevel = 4
+
+
+class clip:
+    """
+    Log argument for large payloads (tool results, model replies).
+
+    The value is only rendered when the record is actually emitted, and then
+    in bounded form: strings are cut to `limit` characters, containers are
+    abbreviated by reprlib instead of being serialized in full. Records that
+    carry a clip() are also subject to LOG_PAYLOAD_SAMPLE_EVERY.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = 500):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value if isinstance(self.value, str) else _repr.repr(self.value)
+        return _truncate(value, self.limit)
+
+    __repr__ = __str__
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}… [+{len(text) - limit} chars]"
+
+
+class _PayloadFilter(logging.Filter):
+    """Samples payload records per call site and tags records with the current trace."""
+
+    def __init__(self):
+        super().__init__()
+        self._seen: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        args = record.args if isinstance(record.args, tuple) else ()
+        if LOG_PAYLOAD_SAMPLE_EVERY > 1 and any(isinstance(arg, clip) for arg in args):
+            site = (record.pathname, record.lineno)
+            with self._lock:
+                seen = self._seen.get(site, 0)
+                self._seen[site] = seen + 1
+            if seen % LOG_PAYLOAD_SAMPLE_EVERY:
+                return False
+        active = current_span()
+        if active is not None:
+            record.trace_id = active.trace_id
+            record.span_id = active.span_id
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message here, while its arguments are still unchanged, then hand a
+        # flat copy to the writer thread. Formatting to text/JSON happens over there.
+        message = _truncate(record.getMessage(), LOG_MAX_MESSAGE_CHARS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        prepared = logging.makeLogRecord(record.__dict__)
+        prepared.msg = message
+        prepared.args = None
+        prepared.exc_info = None
+        return prepared
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace IDs and any exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+            entry["span_id"] = record.span_id
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+_listeners: List[QueueListener] = []
+
+
+def _stop_listeners():
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+
+def setup_logging(name: Optional[str], log_path: Optional[str] = None, console: bool = False,
+                  level: str = LOG_LEVEL) -> logging.Logger:
+    """
+    Attach non-blocking handlers to the logger `name` (None for the root logger).
+
+    Callers only put records on a queue; a background QueueListener writes
+    them to a size-rotated `log_path` (JSON lines unless LOG_FORMAT=text)
+    and/or stderr. Calling it again for the same logger is a no-op.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    if any(isinstance(handler, _QueueHandler) for handler in logger.handlers):
+        return logger
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT, TEXT_DATEFMT)
+    handlers = []
+    if log_path:
+        file_handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                           encoding="utf-8", delay=True)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, TEXT_DATEFMT))
+        handlers.append(console_handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(_PayloadFilter())
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    if not _listeners:
+        atexit.register(_stop_listeners)
+    _listeners.append(listener)
+
+    logger.addHandler(queue_handler)
+    return logger
@@ -0,0 +1,160 @@
+import atexit
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Optional
+import anyio
+import httpx
+import mcp.types
+from fastmcp import Client
+from fastmcp.client.client import CallToolResult
+from fastmcp.client.transports import StreamableHttpTransport
+from fastmcp.exceptions import ToolError
+from mcp.shared.exceptions import McpError
+from logger_config import logger
+from tracing import span
+
+# Error code the MCP client reports when the server answers 404 for an unknown (expired) session
+SESSION_TERMINATED = 32600
+
+
+def _not_delivered(e: Exception) -> bool:
+    """True if a call failed before any server session could have run it."""
+    if isinstance(e, McpError):
+        return e.error.code == SESSION_TERMINATED
+    return isinstance(e, (anyio.ClosedResourceError, anyio.BrokenResourceError, httpx.ConnectError))
+
+
+class MCPSession:
+    """
+    One long-lived MCP client session, shared by every caller in the process.
+
+    The session lives on a background event loop thread. Sync code submits
+    work with `submit()` / `call_tool()` and gets a concurrent Future back,
+    so a tool call costs one request/response instead of a new event loop,
+    an initialize handshake and a ping. The session is opened lazily on first
+    use and reopened after a transport failure. A call is re-sent only when
+    it never reached the server (closed session, refused connection, expired
+    session ID); after a timeout or a dropped response the tool may already
+    have run, so the error goes to the caller.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-session", daemon=True)
+        self._thread.start()
+        self._client: Optional[Client] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _hold_session(self, client: Client, ready: asyncio.Future, stop: asyncio.Event):
+        # Enter and exit the client in the same task, as anyio cancel scopes require
+        try:
+            async with client:
+                ready.set_result(client)
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning("MCP session to %s ended: %s", self.url, e)
+
+    async def _connect(self) -> Client:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._client is not None and self._runner is not None and not self._runner.done():
+                if self._client.is_connected():
+                    return self._client
+                # The transport died under a live runner; close it before opening a new one
+                await self._disconnect()
+
+            logger.info("Opening MCP session to %s", self.url)
+            client = Client(StreamableHttpTransport(url=self.url))
+            ready = self._loop.create_future()
+            self._stop = asyncio.Event()
+            self._runner = asyncio.create_task(self._hold_session(client, ready, self._stop))
+            self._client = await ready
+            return self._client
+
+    async def _disconnect(self):
+        if self._stop is not None:
+            self._stop.set()
+        if self._runner is not None:
+            await asyncio.gather(self._runner, return_exceptions=True)
+        self._client = None
+        self._runner = None
+
+    async def _run(self, fn: Callable[[Client], Awaitable[Any]]):
+        client = await self._connect()
+        try:
+            return await fn(client)
+        except ToolError:
+            raise
+        except Exception as e:
+            if not _not_delivered(e):
+                raise
+            logger.warning("MCP call was not delivered (%s); reconnecting to %s", e, self.url)
+            await self._disconnect()
+            client = await self._connect()
+            return await fn(client)
+
+    def submit(self, fn: Callable[[Client], Awaitable[Any]]) -> Future:
+        """
+        Schedule `fn(client)` on the session loop. Safe to call from any thread.
+        """
+        return asyncio.run_coroutine_threadsafe(self._run(fn), self._loop)
+
+    def call_tool(self, tool_name: str, args: dict, timeout: Optional[float] = None):
+        with span(f"mcp.call {tool_name}", kind="client") as call_span:
+            traceparent = call_span.traceparent
+            future = self.submit(lambda client: call_tool_traced(client, tool_name, args, traceparent))
+            try:
+                return future.result(timeout)
+            except FutureTimeoutError:
+                # Don't leave the call running on the session loop after the caller gave up
+                future.cancel()
+                raise
+
+    def close(self):
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._disconnect(), self._loop).result(timeout=5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+
+async def call_tool_traced(client: Client, name: str, args: dict, traceparent: Optional[str]) -> CallToolResult:
+    """
+    Client.call_tool(), plus the caller's traceparent in the request _meta so the
+    server's spans join the same trace.
+    """
+    if not traceparent:
+        return await client.call_tool(name, args)
+    result = await client.session.send_request(
+        mcp.types.ClientRequest(mcp.types.CallToolRequest(
+            method="tools/call",
+            params=mcp.types.CallToolRequestParams(name=name, arguments=args, _meta={"traceparent": traceparent}),
+        )),
+        mcp.types.CallToolResult,
+    )
+    if result.isError:
+        raise ToolError(result.content[0].text if result.content else f"Tool {name} failed")
+    return CallToolResult(content=result.content, structured_content=result.structuredContent,
+                          is_error=result.isError)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url: str) -> MCPSession:
+    """Return the process-wide session for an MCP server URL, creating it on first use."""
+    with _sessions_lock:
+        session = _sessions.get(url)
+        if session is None:
+            session = MCPSession(url)
+            _sessions[url] = session
+            atexit.register(session.close)
+        return session
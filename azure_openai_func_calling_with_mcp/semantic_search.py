@@ -0,0 +1,372 @@
+import os
+import json
+import queue
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from local_search import tokenize, paper_text
+from paper_store import PaperStore
+
+logger = logging.getLogger(__name__)
+
+# "hashing" (default): lexical similarity from shared words and bigrams, no model download.
+# "sentence-transformers": semantic similarity from a local model; needs the optional
+# sentence-transformers package (and falls back to hashing without it).
+EMBEDDER = os.getenv("EMBEDDER", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+HASHING_DIM = int(os.getenv("HASHING_DIM", "512"))
+# float16 halves memory and disk; scores are computed in float32 either way
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT = float(os.getenv("EMBED_BATCH_WAIT", "0.5"))  # seconds to wait for a batch to fill
+SCORE_CHUNK_ROWS = 65536
+
+VECTORS_FILE = "vectors.bin"
+META_FILE = "vectors_meta.json"
+META_JOURNAL_FILE = "vectors_meta.jsonl"
+# The journal is folded into META_FILE once it outgrows the snapshot (and at least this size)
+META_JOURNAL_MIN_BYTES = 1 << 20
+
+
+class HashingEmbedder:
+    """
+    Feature-hashed bag of words and bigrams, L2-normalized.
+
+    Dependency-free and deterministic. Scores reflect shared vocabulary, not
+    meaning: fine for "more like this" over abstracts, but synonyms and
+    paraphrases do not match. SentenceTransformerEmbedder gives semantic scores.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                vectors[row, h % self.dim] += 1.0 if h & (1 << 63) else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU sentence-transformers model (optional dependency)."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{model_name}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def get_embedder():
+    if EMBEDDER == "sentence-transformers":
+        try:
+            return SentenceTransformerEmbedder()
+        except ImportError:
+            logger.warning("sentence-transformers is not installed; falling back to the hashing embedder")
+    return HashingEmbedder()
+
+
+class EmbeddingIndex:
+    """
+    Unit-length paper embeddings in one contiguous memory-mapped matrix.
+
+    Row i of `vectors.bin` belongs to the i-th ID in the metadata file.
+    Capacity doubles as papers are added. A re-embedded paper overwrites its
+    own row, so the matrix never holds stale duplicates.
+
+    The metadata is a snapshot plus a journal with one line per batch, so
+    a batch costs an append; the journal is folded into the snapshot once
+    it outgrows it, and on load and close.
+
+    Saved papers are queued by a store listener, and a background worker
+    embeds them in batches of EMBED_BATCH_SIZE. Nothing is embedded inline
+    with a request, so a paper becomes searchable shortly after it is saved.
+    """
+
+    def __init__(self, store: PaperStore, index_dir: str, embedder=None, dtype: str = EMBEDDING_DTYPE):
+        self.store = store
+        self.index_dir = index_dir
+        self.embedder = embedder or get_embedder()
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = os.path.join(index_dir, VECTORS_FILE)
+        self.meta_path = os.path.join(index_dir, META_FILE)
+        self.journal_path = os.path.join(index_dir, META_JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._topic_versions: Dict[str, object] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._generation = 0  # snapshot number; journal lines from older snapshots are ignored
+        self._snapshot_bytes = 0
+        self._journal_bytes = 0
+        # (paper_id, text, fingerprint) items, ("", topic, version) markers, None to stop
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._load()
+        store.add_listener(self._on_save)
+        self._worker = threading.Thread(target=self._run, name="embedder", daemon=True)
+        self._worker.start()
+
+    # ---- storage -------------------------------------------------------
+
+    def _load(self):
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("embedder") != self.embedder.name or meta.get("dtype") != self.dtype.name:
+            logger.info("Embedding settings changed; re-embedding all papers")
+            return
+        self._ids = meta["ids"]
+        self._rows = {paper_id: row for row, paper_id in enumerate(self._ids)}
+        self._fingerprints = meta["fingerprints"]
+        self._topic_versions = meta["topic_versions"]
+        self._generation = meta.get("generation", 0)
+        capacity = self._replay_journal(meta["capacity"])
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+",
+                                 shape=(capacity, self.embedder.dim))
+        self._write_meta()
+        logger.info("Loaded %d paper embeddings (%s)", len(self._ids), self.embedder.name)
+
+    def _replay_journal(self, capacity: int) -> int:
+        """Apply journal lines written since the snapshot; returns the matrix capacity."""
+        try:
+            with open(self.journal_path, "r") as f:
+                lines = f.readlines()
+        except OSError:
+            return capacity
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # torn write; later rows would be misnumbered
+            if entry.get("generation") != self._generation:
+                continue
+            if entry["row"] != len(self._ids):
+                break
+            for paper_id in entry["ids"]:
+                self._rows[paper_id] = len(self._ids)
+                self._ids.append(paper_id)
+            self._fingerprints.update(entry["fingerprints"])
+            self._topic_versions.update(entry["topic_versions"])
+            capacity = max(capacity, entry["capacity"])
+        return capacity
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        tmp_path = f"{self.vectors_path}.tmp"
+        grown = np.memmap(tmp_path, dtype=self.dtype, mode="w+", shape=(new_capacity, self.embedder.dim))
+        if capacity:
+            grown[:capacity] = self._matrix
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.vectors_path)
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+",
+                                 shape=(new_capacity, self.embedder.dim))
+
+    def _write_meta(self):
+        """Write a full snapshot and start a new (empty) journal."""
+        meta = {
+            "embedder": self.embedder.name,
+            "dtype": self.dtype.name,
+            "capacity": self._matrix.shape[0],
+            "generation": self._generation + 1,
+            "ids": self._ids,
+            "fingerprints": self._fingerprints,
+            "topic_versions": self._topic_versions,
+        }
+        data = json.dumps(meta, separators=(",", ":"))
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.meta_path)
+        self._generation += 1
+        self._snapshot_bytes = len(data)
+        with open(self.journal_path, "w"):
+            pass
+        self._journal_bytes = 0
+
+    def _append_meta(self, row: int, new_ids: List[str], fingerprints: Dict[str, str], versions: Dict[str, object]):
+        """Record one batch, or fold everything into a snapshot when the journal has grown."""
+        if self._journal_bytes > max(self._snapshot_bytes, META_JOURNAL_MIN_BYTES) or not os.path.exists(self.meta_path):
+            self._write_meta()
+            return
+        entry = {
+            "generation": self._generation,
+            "row": row,
+            "capacity": self._matrix.shape[0],
+            "ids": new_ids,
+            "fingerprints": fingerprints,
+            "topic_versions": versions,
+        }
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with open(self.journal_path, "a") as f:
+            f.write(line)
+        self._journal_bytes += len(line)
+
+    # ---- ingestion -----------------------------------------------------
+
+    def _on_save(self, topic: str, papers: Dict[str, dict]):
+        self.enqueue(papers, topic, self.store.topic_version(topic))
+
+    def enqueue(self, papers: Dict[str, dict], topic: Optional[str] = None, version=None):
+        """Queue papers for background embedding (unchanged ones are skipped)."""
+        for paper_id, paper_info in papers.items():
+            text = paper_text(paper_info)
+            fingerprint = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+            if self._fingerprints.get(paper_id) != fingerprint:
+                self._queue.put((paper_id, text, fingerprint))
+        if topic is not None and version is not None:
+            # Recorded once the papers queued before it are written
+            self._queue.put(("", topic, json.loads(json.dumps(version))))
+
+    def sync(self):
+        """Queue papers from topics that changed since the embeddings were last written."""
+        for topic in self.store.list_topics():
+            version = self.store.topic_version(topic)
+            if version is None or json.loads(json.dumps(version)) == self._topic_versions.get(topic):
+                continue
+            try:
+                papers = self.store.get_topic_papers(topic)
+            except ValueError as e:
+                logger.warning("Skipping unreadable topic %s while embedding: %s", topic, e)
+                continue
+            self.enqueue(papers, topic, version)
+
+    def _next_batch(self) -> Optional[list]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        while len(batch) < EMBED_BATCH_SIZE:
+            try:
+                item = self._queue.get(timeout=EMBED_BATCH_WAIT)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._embed_batch(batch)
+            except Exception:
+                logger.exception("Embedding batch of %d items failed", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _embed_batch(self, batch: list):
+        papers = {}
+        versions = {}
+        for paper_id, text_or_topic, value in batch:
+            if paper_id:
+                papers[paper_id] = (text_or_topic, value)
+            else:
+                versions[text_or_topic] = value
+        paper_ids = list(papers)
+        vectors = self.embedder.embed([papers[paper_id][0] for paper_id in paper_ids]) if paper_ids else None
+
+        with self._lock:
+            row = len(self._ids)
+            new_ids = [paper_id for paper_id in paper_ids if paper_id not in self._rows]
+            self._ensure_capacity(len(self._ids) + len(new_ids))
+            for paper_id in new_ids:
+                self._rows[paper_id] = len(self._ids)
+                self._ids.append(paper_id)
+            if paper_ids:
+                rows = [self._rows[paper_id] for paper_id in paper_ids]
+                self._matrix[rows] = vectors.astype(self.dtype)
+                self._matrix.flush()
+            fingerprints = {paper_id: papers[paper_id][1] for paper_id in paper_ids}
+            self._fingerprints.update(fingerprints)
+            self._topic_versions.update(versions)
+            if self._matrix is not None:
+                self._append_meta(row, new_ids, fingerprints, versions)
+        if paper_ids:
+            logger.info("Embedded %d papers (%d total)", len(paper_ids), len(self._ids))
+
+    def wait_idle(self):
+        """Block until every queued paper has been embedded."""
+        self._queue.join()
+
+    # ---- queries -------------------------------------------------------
+
+    def _top_k(self, query: np.ndarray, limit: int, exclude: Optional[int] = None) -> List[Tuple[str, float]]:
+        # A zero query (e.g. text with no tokens) is equally far from everything
+        if limit < 1 or not np.any(query):
+            return []
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return []
+            matrix = self._matrix
+            ids = self._ids[:count]
+        query = query.astype(np.float32)
+        # Matrix-vector product in row chunks, so float16 storage is upcast a slice at a time
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_ROWS):
+            stop = min(start + SCORE_CHUNK_ROWS, count)
+            scores[start:stop] = np.asarray(matrix[start:stop], dtype=np.float32) @ query
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(limit, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[row], float(scores[row])) for row in top if np.isfinite(scores[row])]
+
+    def similar_to_text(self, text: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Papers whose embedding is closest (cosine) to the embedding of `text`."""
+        return self._top_k(self.embedder.embed([text])[0], limit)
+
+    def similar_to_paper(self, paper_id: str, limit: int = 10) -> Optional[List[Tuple[str, float]]]:
+        """Papers closest to a stored paper (None if that paper has no embedding yet)."""
+        with self._lock:
+            row = self._rows.get(paper_id)
+            if row is None:
+                return None
+            query = np.array(self._matrix[row], dtype=np.float32)
+        return self._top_k(query, limit, exclude=row)
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+        with self._lock:
+            if self._matrix is not None:
+                self._write_meta()
+
+
+def get_embedding_index(store: PaperStore, paper_dir: str) -> EmbeddingIndex:
+    """
+    Build the embedding index for a store (kept under EMBEDDING_DIR, default
+    `<paper_dir>/.embeddings`) and queue whatever it is missing.
+    """
+    index = EmbeddingIndex(store, os.getenv("EMBEDDING_DIR", os.path.join(paper_dir, ".embeddings")))
+    index.sync()
+    return index
@@ -1,25 +1,18 @@
 import os
-import json
-from fastmcp import Client
-from fastmcp.client.transports import StreamableHttpTransport
 from logger_config import logger
+from logging_setup import clip
+from mcp_session import get_session
 
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8001/mcp")
 
-# Setup MCP client with Streamable HTTP transport
-transport = StreamableHttpTransport(url=MCP_SERVER_URL)
-client = Client(transport)
+# Long-lived MCP session (Streamable HTTP) on a background event loop
+mcp_session = get_session(MCP_SERVER_URL)
 
 def call_mcp_tool(tool_name: str, args: dict):
-    async def run_call():
-        async with client:
-            await client.ping()
-            logger.info(f"Calling MCP tool: {tool_name} with args {args}")
-            result = await client.call_tool(tool_name, args)
-            logger.info(f"Tool result: {result}")
-            return result
-    import asyncio
-    return asyncio.run(run_call())
+    logger.info("Calling MCP tool: %s with args %s", tool_name, args)
+    result = mcp_session.call_tool(tool_name, args)
+    logger.info("Tool result: %s", clip(result))
+    return result
 
 def search_papers(topic: str, max_results: int = 5):
     return call_mcp_tool("search_papers", {"topic": topic, "max_results": max_results})
@@ -27,6 +20,18 @@ def search_papers(topic: str, max_results: int = 5):
 def extract_info(paper_id: str):
     return call_mcp_tool("extract_info", {"paper_id": paper_id})
 
+def search_local(query: str, limit: int = 10):
+    return call_mcp_tool("search_local", {"query": query, "limit": limit})
+
+def search_similar(query: str = "", paper_id: str = "", limit: int = 10):
+    return call_mcp_tool("search_similar", {"query": query, "paper_id": paper_id, "limit": limit})
+
+def search_papers_batch(topics: list, max_results: int = 5):
+    return call_mcp_tool("search_papers_batch", {"topics": topics, "max_results": max_results})
+
+def extract_info_batch(paper_ids: list):
+    return call_mcp_tool("extract_info_batch", {"paper_ids": paper_ids})
+
 
 # Define tool schema to match LLM expectations
 tools_schema = [
@@ -58,11 +63,72 @@ tools_schema = [
                 "required": ["paper_id"]
             }
         },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_local",
+            "description": "Full-text search over papers already stored locally, without calling arXiv",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Keywords to look for"},
+                    "limit": {"type": "integer", "description": "Number of papers to return"}
+                },
+                "required": ["query"]
+            }
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_similar",
+            "description": "Find stored papers similar to a text or to a stored paper (embedding similarity over stored abstracts, no arXiv call)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Text to find similar papers for"},
+                    "paper_id": {"type": "string", "description": "ID of a stored paper to find similar papers for"},
+                    "limit": {"type": "integer", "description": "Number of papers to return"}
+                }
+            }
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_papers_batch",
+            "description": "Search arXiv for several research topics in one call",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "topics": {"type": "array", "items": {"type": "string"}, "description": "Research topics to search"},
+                    "max_results": {"type": "integer", "description": "Number of papers to return per topic"}
+                },
+                "required": ["topics"]
+            }
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "extract_info_batch",
+            "description": "Extract metadata and summaries of several papers using their IDs",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "paper_ids": {"type": "array", "items": {"type": "string"}, "description": "IDs of the papers"}
+                },
+                "required": ["paper_ids"]
+            }
+        },
     }
 ]
 
 # System prompt
 system_prompt = (
     "You are an academic research assistant that can search for research papers and summarize them "
-    "using available tools. Use `search_papers` to find papers and `extract_info` to get detailed info."
+    "using available tools. Use `search_local` to find papers that are already stored, "
+    "`search_papers` to find new papers and `extract_info` to get detailed info. "
+    "For several topics or papers, make one `search_papers_batch` or `extract_info_batch` call instead."
 )
\ No newline at end of file
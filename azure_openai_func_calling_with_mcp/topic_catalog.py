@@ -0,0 +1,112 @@
+import os
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from paper_store import PaperStore
+
+# How often a read re-stats every topic to catch papers added by other processes
+CATALOG_RECHECK_SECONDS = float(os.getenv("CATALOG_RECHECK_SECONDS", "10"))
+
+
+class TopicEntry(NamedTuple):
+    count: int
+    updated: float  # unix time
+    version: object
+
+
+class TopicCatalog:
+    """
+    In-memory list of topics with their paper counts and last-update times.
+
+    Saves made through the store update the catalog directly. Reads only
+    compare the store's catalog_version() (a directory mtime for the JSON
+    store, one indexed query for SQLite) and re-stat individual topics at
+    most every CATALOG_RECHECK_SECONDS, instead of walking PAPER_DIR each time.
+
+    Every change produces a new etag, so clients (and the server's own
+    change notifications) can tell whether the catalog really changed.
+    """
+
+    def __init__(self, store: PaperStore, recheck_interval: float = CATALOG_RECHECK_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.store = store
+        self.recheck_interval = recheck_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._topics: Dict[str, TopicEntry] = {}
+        self._etag = self._compute_etag()
+        self._store_token = None
+        self._checked_at = float("-inf")
+        store.add_listener(self._on_save)
+        self.refresh(force=True)
+
+    @property
+    def etag(self) -> str:
+        """Etag of the catalog as last seen (does not re-check the store)."""
+        return self._etag
+
+    def __contains__(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def _compute_etag(self) -> str:
+        digest = hashlib.sha1()
+        for topic in sorted(self._topics):
+            entry = self._topics[topic]
+            digest.update(f"{topic}\0{entry.count}\0{entry.version}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def _apply(self, changes: Dict[str, Optional[TopicEntry]]):
+        """Apply {topic: entry, or None if the topic is gone} and re-tag if anything changed."""
+        with self._lock:
+            changed = False
+            for topic, entry in changes.items():
+                current = self._topics.get(topic)
+                if entry is None:
+                    if current is not None:
+                        del self._topics[topic]
+                        changed = True
+                elif current is None or current.version != entry.version:
+                    self._topics[topic] = entry
+                    changed = True
+            if changed:
+                self._etag = self._compute_etag()
+
+    def _stats_entry(self, topic: str) -> Optional[TopicEntry]:
+        stats = self.store.topic_stats(topic)
+        if stats is None:
+            return None
+        current = self._topics.get(topic)
+        if current is not None and current.version == stats.version:
+            return current
+        updated = stats.updated if stats.updated is not None else self.clock()
+        return TopicEntry(stats.count, updated, stats.version)
+
+    def _on_save(self, topic: str, papers: Dict[str, dict]):
+        self._apply({topic: self._stats_entry(topic)})
+
+    def _rescan(self):
+        topics = self.store.list_topics()
+        changes = {topic: self._stats_entry(topic) for topic in topics}
+        for topic in set(self._topics) - set(changes):
+            changes[topic] = None
+        self._checked_at = self.clock()
+        self._apply(changes)
+
+    def refresh(self, force: bool = False):
+        """Re-check the store if its catalog token moved or the recheck interval passed."""
+        token = self.store.catalog_version()
+        if force or token is None or token != self._store_token \
+                or self.clock() - self._checked_at >= self.recheck_interval:
+            self._store_token = token
+            self._rescan()
+
+    def snapshot(self) -> Tuple[str, Dict[str, TopicEntry]]:
+        """
+        Return (etag, {topic: TopicEntry}) for the current catalog.
+
+        A client that still holds the same etag already has the current list.
+        """
+        self.refresh()
+        with self._lock:
+            return self._etag, dict(self._topics)
@@ -0,0 +1,99 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+from paper_store import PaperStore, topic_dir_name
+
+RESOURCE_PAGE_SIZE = int(os.getenv("RESOURCE_PAGE_SIZE", "50"))
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "128"))  # topics
+
+
+def render_paper(paper_id: str, paper_info: dict) -> str:
+    """Markdown section for one paper, as shown by the papers://{topic} resource."""
+    return "".join([
+        f"## {paper_info['title']}\n",
+        f"- **Paper ID**: {paper_id}\n",
+        f"- **Authors**: {', '.join(paper_info['authors'])}\n",
+        f"- **Published**: {paper_info['published']}\n",
+        f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n",
+        f"### Summary\n{paper_info['summary'][:500]}...\n\n",
+        "---\n\n",
+    ])
+
+
+class _RenderedTopic:
+    def __init__(self, version: Optional[Hashable]):
+        self.version = version
+        self.order: List[str] = []
+        self.sections: Dict[str, str] = {}
+
+    def add(self, paper_id: str, paper_info: dict):
+        if paper_id not in self.sections:
+            self.order.append(paper_id)
+        self.sections[paper_id] = render_paper(paper_id, paper_info)
+
+
+class TopicRenderCache:
+    """
+    LRU cache of per-paper markdown sections for each topic.
+
+    An entry is valid while store.topic_version(topic) is unchanged. Saves
+    made through the store in this process patch the cached entry in place
+    (only the new papers get rendered). Changes made by another process show
+    up as a version mismatch and trigger a full re-render.
+    """
+
+    def __init__(self, store: PaperStore, maxsize: int = RENDER_CACHE_SIZE):
+        self.store = store
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _RenderedTopic]" = OrderedDict()
+        store.add_listener(self._on_save)
+
+    def _on_save(self, topic: str, papers: Dict[str, dict]):
+        with self._lock:
+            entry = self._entries.get(topic)
+            if entry is None:
+                return
+            for paper_id, paper_info in papers.items():
+                entry.add(paper_id, paper_info)
+            entry.version = self.store.topic_version(topic)
+
+    def _get_entry(self, topic: str) -> Optional[_RenderedTopic]:
+        version = self.store.topic_version(topic)
+        if version is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(topic)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(topic)
+                return entry
+
+        papers = self.store.get_topic_papers(topic)
+        entry = _RenderedTopic(version)
+        for paper_id, paper_info in papers.items():
+            entry.add(paper_id, paper_info)
+        with self._lock:
+            self._entries[topic] = entry
+            self._entries.move_to_end(topic)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_page(self, topic: str, cursor: int = 0,
+                 page_size: int = RESOURCE_PAGE_SIZE) -> Optional[Tuple[str, int, Optional[int]]]:
+        """
+        Render one page of a topic.
+
+        Returns:
+            (markdown body, total papers, next cursor or None), or None if the topic has no papers
+        """
+        entry = self._get_entry(topic_dir_name(topic))
+        if entry is None:
+            return None
+        with self._lock:
+            total = len(entry.order)
+            page_ids = entry.order[cursor:cursor + page_size]
+            body = "".join(entry.sections[paper_id] for paper_id in page_ids)
+        next_cursor = cursor + page_size if cursor + page_size < total else None
+        return body, total, next_cursor
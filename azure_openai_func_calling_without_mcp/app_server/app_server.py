@@ -1,43 +1,202 @@
-from fastapi import FastAPI, Query
-from tools import search_papers, extract_info
+import os
+import json
+import time
+from contextlib import asynccontextmanager
+from anyio import to_thread
+from typing import List
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from tools import (
+    search_papers_async, extract_info_async, search_papers_batch_async, extract_info_batch_async,
+    search_local_async, search_similar_async, start_search_stream, local_index, embedding_index
+)
+from arxiv_service import arxiv_service
+from tracing import configure as configure_tracing, span
+from metrics import CONTENT_TYPE, REGISTRY, REQUESTS, REQUEST_SECONDS
 from logger_config import logger
+from logging_setup import clip
 
-app = FastAPI()
+# Worker threads available for offloaded disk I/O (Starlette's default is 40)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+    await arxiv_service.aclose()
+    await to_thread.run_sync(local_index.close)
+    await to_thread.run_sync(embedding_index.close)
+
+
+app = FastAPI(lifespan=lifespan)
+configure_tracing("paper-app-server")
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Continue the caller's trace (traceparent header) for everything this request does
+    started = time.perf_counter()
+    status = "500"
+    try:
+        with span(f"{request.method} {request.url.path}", traceparent=request.headers.get("traceparent"),
+                  kind="server") as server_span:
+            response = await call_next(request)
+            server_span.set_attribute("http.status_code", response.status_code)
+            status = str(response.status_code)
+            return response
+    finally:
+        # Label by route template, not raw path, so /papers/{id} stays one series
+        route = request.scope.get("route")
+        tool = f"{request.method} {route.path}" if route is not None else "unmatched"
+        REQUESTS.inc(tool=tool, status=status)
+        # Streaming responses are timed to their first byte
+        REQUEST_SECONDS.observe(time.perf_counter() - started, tool=tool)
+
+# Upper bounds for one batch request
+MAX_BATCH_TOPICS = int(os.getenv("MAX_BATCH_TOPICS", "10"))
+MAX_BATCH_PAPERS = int(os.getenv("MAX_BATCH_PAPERS", "100"))
+
+
+class SearchBatchRequest(BaseModel):
+    topics: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_TOPICS)
+    max_results: int = 5
+
+
+class ExtractBatchRequest(BaseModel):
+    paper_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_PAPERS)
 
 
 @app.get("/search_papers")
-def search_papers_endpoint(topic: str = Query(...), max_results: int = 5):
+async def search_papers_endpoint(topic: str = Query(...), max_results: int = 5):
     """
     Endpoint to search for papers and store them.
     Returns a list of paper IDs.
     """
-    logger.info(f"🔍 Endpoint hit: /search_papers with topic='{topic}', max_results={max_results}")
+    logger.info("🔍 Endpoint hit: /search_papers with topic='%s', max_results=%s", topic, max_results)
+    try:
+        result = await search_papers_async(topic, max_results)
+        logger.info("✅ Search complete. Found paper IDs: %s", clip(result))
+        return result
+    except Exception as e:
+        logger.exception("❌ Error in search_papers: %s", e)
+        return {"error": str(e)}
+
+
+@app.get("/search_papers/stream")
+async def search_papers_stream_endpoint(topic: str = Query(...), max_results: int = 5):
+    """
+    Streaming variant of /search_papers (NDJSON).
+    Sends {"paper_ids": [...]} per batch of papers as soon as it is stored, then {"done": true, "total": n}.
+    If the client stops reading, the remaining pages are still fetched and stored.
+    """
+    logger.info("🔍 Endpoint hit: /search_papers/stream with topic='%s', max_results=%s", topic, max_results)
+    stream = start_search_stream(topic, max_results)
+
+    async def ndjson():
+        total = 0
+        try:
+            async for paper_ids in stream.pages():
+                total += len(paper_ids)
+                yield json.dumps({"paper_ids": paper_ids}) + "\n"
+        except Exception as e:
+            logger.exception("❌ Error in streamed search: %s", e)
+            yield json.dumps({"error": str(e)}) + "\n"
+            return
+        yield json.dumps({"done": True, "total": total}) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@app.post("/search_papers")
+async def search_papers_batch_endpoint(request: SearchBatchRequest):
+    """
+    Batch endpoint: search several topics concurrently.
+    Returns {topic: [paper IDs]}.
+    """
+    logger.info("🔍 Endpoint hit: POST /search_papers with topics=%s, max_results=%s",
+                request.topics, request.max_results)
     try:
-        result = search_papers(topic, max_results)
-        logger.info(f"✅ Search complete. Found paper IDs: {result}")
+        result = await search_papers_batch_async(request.topics, request.max_results)
+        logger.info("✅ Batch search complete for %s topics", len(result))
         return result
     except Exception as e:
-        logger.exception(f"❌ Error in search_papers: {e}")
+        logger.exception("❌ Error in search_papers batch: %s", e)
+        return {"error": str(e)}
+
+
+@app.get("/search_local")
+async def search_local_endpoint(query: str = Query(...), limit: int = 10):
+    """
+    Endpoint to search papers already stored, without calling arXiv.
+    Returns paper IDs, titles and BM25 scores, best match first.
+    """
+    logger.info("🔎 Endpoint hit: /search_local with query='%s', limit=%s", query, limit)
+    try:
+        result = await search_local_async(query, limit)
+        logger.info("✅ Local search returned %s papers", len(result))
+        return result
+    except Exception as e:
+        logger.exception("❌ Error in search_local: %s", e)
+        return {"error": str(e)}
+
+
+@app.get("/search_similar")
+async def search_similar_endpoint(query: str = "", paper_id: str = "", limit: int = 10):
+    """
+    Endpoint to find stored papers similar to a text (query) or to a stored paper (paper_id).
+    Returns paper IDs, titles and cosine scores, best match first.
+    """
+    logger.info("🧭 Endpoint hit: /search_similar with query='%s', paper_id='%s', limit=%s", query, paper_id, limit)
+    try:
+        result = await search_similar_async(query, paper_id, limit)
+        logger.info("✅ Similarity search returned %s entries", len(result))
+        return result
+    except Exception as e:
+        logger.exception("❌ Error in search_similar: %s", e)
         return {"error": str(e)}
 
 
 @app.get("/extract_info")
-def extract_info_endpoint(paper_id: str = Query(...)):
+async def extract_info_endpoint(paper_id: str = Query(...)):
     """
     Endpoint to extract info about a paper.
     Returns the full metadata if found.
     """
-    logger.info(f"📄 Endpoint hit: /extract_info with paper_id='{paper_id}'")
+    logger.info("📄 Endpoint hit: /extract_info with paper_id='%s'", paper_id)
     try:
-        result = extract_info(paper_id)
-        logger.info(f"✅ Extraction result: {result}")
+        result = await extract_info_async(paper_id)
+        logger.info("✅ Extraction result: %s", clip(result))
         return result
     except Exception as e:
-        logger.exception(f"❌ Error in extract_info: {e}")
+        logger.exception("❌ Error in extract_info: %s", e)
+        return {"error": str(e)}
+
+
+@app.post("/extract_info")
+async def extract_info_batch_endpoint(request: ExtractBatchRequest):
+    """
+    Batch endpoint: look up several papers in one store pass.
+    Returns {paper_id: metadata or error}.
+    """
+    logger.info("📄 Endpoint hit: POST /extract_info with %s paper IDs", len(request.paper_ids))
+    try:
+        result = await extract_info_batch_async(request.paper_ids)
+        logger.info("✅ Batch extraction returned %s entries", len(result))
+        return result
+    except Exception as e:
+        logger.exception("❌ Error in extract_info batch: %s", e)
         return {"error": str(e)}
 
 
 @app.get("/health")
-def health_check():
+async def health_check():
     logger.info("❤️ Health check ping received.")
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics (request, arXiv, cache, store and threadpool)."""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
\ No newline at end of file
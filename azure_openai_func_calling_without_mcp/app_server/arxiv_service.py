@@ -0,0 +1,249 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import httpx
+import feedparser
+from search_cache import normalize_topic, PartialResults, SearchResults
+from tracing import span, traced
+from metrics import counter, gauge_callback, histogram
+
+logger = logging.getLogger(__name__)
+
+# arXiv asks API clients for no more than one request every three seconds
+ARXIV_RATE = float(os.getenv("ARXIV_RATE", "0.34"))  # requests per second
+ARXIV_BURST = float(os.getenv("ARXIV_BURST", "1"))
+ARXIV_PAGE_SIZE = int(os.getenv("ARXIV_PAGE_SIZE", "100"))
+ARXIV_NUM_RETRIES = int(os.getenv("ARXIV_NUM_RETRIES", "3"))
+ARXIV_POOL_SIZE = int(os.getenv("ARXIV_POOL_SIZE", "10"))
+ARXIV_TIMEOUT = float(os.getenv("ARXIV_TIMEOUT", "30"))
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+
+ARXIV_REQUESTS = counter("arxiv_requests_total", "Upstream arXiv requests, by outcome (ok, empty, error)",
+                         ("outcome",))
+ARXIV_REQUEST_SECONDS = histogram("arxiv_request_seconds", "Latency of one upstream arXiv request in seconds")
+ARXIV_WAIT_SECONDS = histogram("arxiv_rate_limit_wait_seconds", "Time spent waiting for the arXiv rate limit")
+
+# Result orderings, as arXiv API query parameters
+SORT_PARAMS = {
+    "relevance": "relevance",
+    "submitted": "submittedDate",
+    "updated": "lastUpdatedDate",
+}
+
+
+class IncompleteSearch(Exception):
+    """arXiv kept answering with an empty page before the end of the result set."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for upstream requests.
+
+    Callers reserve tokens and then sleep until their reservation is due, so
+    requests are served strictly in arrival order. A request for more tokens
+    than the bucket holds is let through once the bucket is full and leaves
+    it in debt, so large requests are paced rather than starved.
+    """
+
+    def __init__(self, rate: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take `tokens` and return how many seconds the caller must wait before using them."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            needed = min(tokens, self.capacity)
+            wait = max(0.0, (needed - self._tokens) / self.rate)
+            self._tokens -= tokens
+            return wait
+
+    def _track_waiter(self, delta: int):
+        with self._lock:
+            self._waiting += delta
+
+    async def acquire_async(self, tokens: float = 1.0):
+        """Wait without blocking the event loop until `tokens` are available."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self._track_waiter(1)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._track_waiter(-1)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers currently waiting for tokens."""
+        return self._waiting
+
+
+class AsyncSingleFlight:
+    """
+    Collapse concurrent coroutine calls with the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in flight
+    wait for and share its result (or exception). For one event loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        future = self._calls.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody else awaited isn't reported as lost
+            future.exception()
+            raise
+        finally:
+            del self._calls[key]
+
+
+def entry_to_result(entry) -> Tuple[str, dict]:
+    """Convert a feedparser Atom entry to the (paper_id, paper_info) pair we store."""
+    pdf_url = next((link.href for link in entry.get("links", []) if link.get("title") == "pdf"), None)
+    return entry.id.split("arxiv.org/abs/")[-1], {
+        'title': re.sub(r"\s+", " ", entry.get("title", "0")),
+        'authors': [author.name for author in entry.get("authors", [])],
+        'summary': entry.get("summary", ""),
+        'pdf_url': pdf_url,
+        'published': entry.published[:10]
+    }
+
+
+class ArxivService:
+    """
+    Process-wide arXiv fetcher.
+
+    Every caller shares one pooled httpx.AsyncClient. Upstream page requests
+    are paced by a global FIFO token bucket, and identical in-flight searches
+    are merged into a single upstream call.
+    """
+
+    def __init__(self, rate: float = ARXIV_RATE, burst: float = ARXIV_BURST,
+                 page_size: int = ARXIV_PAGE_SIZE, num_retries: int = ARXIV_NUM_RETRIES):
+        self.page_size = page_size
+        self.bucket = TokenBucket(rate, burst)
+        self.num_retries = num_retries
+        self._async_flights = AsyncSingleFlight()
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=ARXIV_TIMEOUT,
+                limits=httpx.Limits(max_connections=ARXIV_POOL_SIZE, max_keepalive_connections=ARXIV_POOL_SIZE),
+            )
+        return self._async_client
+
+    async def search_async(self, topic: str, max_results: int, sort: str = "relevance") -> SearchResults:
+        """
+        Return (paper_id, paper_info) pairs for a topic in rank order, fetched
+        page by page with httpx so the event loop is never held up.
+        """
+        key = (normalize_topic(topic), max_results, sort)
+        return await self._async_flights.do(key, lambda: self._fetch_async(topic, max_results, sort))
+
+    async def _fetch_page(self, topic: str, sort: str, start: int, size: int) -> list:
+        params = {
+            "search_query": topic,
+            "id_list": "",
+            "sortBy": SORT_PARAMS[sort],
+            "sortOrder": "descending",
+            "start": start,
+            "max_results": size,
+        }
+        client = self._get_async_client()
+        with span("arxiv.fetch_page", kind="client", start=start, size=size) as page_span:
+            for attempt in range(self.num_retries + 1):
+                with ARXIV_WAIT_SECONDS.time():
+                    await self.bucket.acquire_async()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(ARXIV_API_URL, params=params)
+                    ARXIV_REQUEST_SECONDS.observe(time.perf_counter() - started)
+                    response.raise_for_status()
+                    feed = feedparser.parse(response.text)
+                    total = int(feed.feed.get("opensearch_totalresults", 0))
+                    # arXiv sometimes answers with an empty page mid-result set; treat as retryable
+                    if feed.entries or start >= total:
+                        ARXIV_REQUESTS.inc(outcome="ok")
+                        page_span.set_attribute("entries", len(feed.entries))
+                        page_span.set_attribute("attempts", attempt + 1)
+                        return feed.entries
+                    ARXIV_REQUESTS.inc(outcome="empty")
+                    logger.warning("Empty arXiv page for %r at start=%d (try %d)", topic, start, attempt)
+                except httpx.HTTPError as e:
+                    ARXIV_REQUESTS.inc(outcome="error")
+                    if attempt == self.num_retries:
+                        raise
+                    logger.warning("arXiv request for %r failed (try %d): %s", topic, attempt, e)
+            raise IncompleteSearch(f"arXiv returned no results for {topic!r} at start={start} "
+                                   f"after {self.num_retries + 1} tries")
+
+    async def iter_pages_async(self, topic: str, max_results: int, sort: str = "relevance",
+                               first_page: Optional[int] = None) -> AsyncIterator[SearchResults]:
+        """
+        Yield results one arXiv page at a time, as soon as each page arrives.
+        Raises IncompleteSearch (after the pages already yielded) if a page
+        stays empty before the end of the result set.
+
+        Args:
+            first_page: Size of the first page (smaller than page_size gets the
+                        first results back sooner); later pages use page_size
+        """
+        start = 0
+        size = min(first_page or self.page_size, max_results)
+        while start < max_results:
+            entries = await self._fetch_page(topic, sort, start, size)
+            if entries:
+                yield [entry_to_result(entry) for entry in entries][:max_results - start]
+            if len(entries) < size:
+                return
+            start += size
+            size = min(self.page_size, max_results - start)
+
+    @traced("arxiv.search")
+    async def _fetch_async(self, topic: str, max_results: int, sort: str) -> SearchResults:
+        results = []
+        try:
+            async for page in self.iter_pages_async(topic, max_results, sort):
+                results.extend(page)
+        except IncompleteSearch as e:
+            logger.warning("%s; returning the %d results fetched so far", e, len(results))
+            return PartialResults(results[:max_results])
+        return results[:max_results]
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+# Shared by every request handler in this process
+arxiv_service = ArxivService()
+
+gauge_callback("arxiv_rate_limit_queue_depth", "Requests waiting for an arXiv rate-limit token",
+               lambda: arxiv_service.bucket.queue_depth)
@@ -0,0 +1,312 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAPERS_FILE = "papers_info.json"
+INDEX_FILE = "papers_index.json"
+# After a lookup miss, rescan topic directories at most this often
+# (a new topic directory is picked up right away)
+INDEX_MISS_REFRESH_SECONDS = float(os.getenv("INDEX_MISS_REFRESH_SECONDS", "1"))
+
+_WS = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def scan_offsets(data: bytes) -> Dict[str, Tuple[int, int]]:
+    """
+    Walk the top-level JSON object in `data` and return the byte span of every value.
+
+    Returns:
+        {paper_id: (offset, length)} so a single paper can be read back with one seek
+    """
+    text = data.decode("utf-8")
+    ascii_only = len(text) == len(data)
+    # Map char positions to byte positions incrementally (positions only ever grow)
+    last = [0, 0]
+
+    def to_byte(pos: int) -> int:
+        if ascii_only:
+            return pos
+        last[1] += len(text[last[0]:pos].encode("utf-8"))
+        last[0] = pos
+        return last[1]
+
+    spans = {}
+    idx = _WS.match(text, 0).end()
+    if text[idx:idx + 1] != "{":
+        raise ValueError("papers file is not a JSON object")
+    idx = _WS.match(text, idx + 1).end()
+    if text[idx:idx + 1] == "}":
+        return spans
+
+    while True:
+        key, idx = _decoder.raw_decode(text, idx)
+        idx = _WS.match(text, idx).end()
+        if text[idx:idx + 1] != ":":
+            raise ValueError(f"expected ':' at position {idx}")
+        start = _WS.match(text, idx + 1).end()
+        _, end = _decoder.raw_decode(text, start)
+        byte_start = to_byte(start)
+        spans[key] = (byte_start, to_byte(end) - byte_start)
+        idx = _WS.match(text, end).end()
+        if text[idx:idx + 1] == ",":
+            idx = _WS.match(text, idx + 1).end()
+        elif text[idx:idx + 1] == "}":
+            return spans
+        else:
+            raise ValueError(f"expected ',' or '}}' at position {idx}")
+
+
+def dump_with_offsets(papers: Dict[str, dict]) -> Tuple[bytes, Dict[str, Tuple[int, int]]]:
+    """
+    Serialize papers as one compact JSON object and record each value's byte span.
+
+    Produces the same spans scan_offsets() would find, without re-parsing the output.
+    """
+    parts = [b"{"]
+    spans = {}
+    pos = 1
+    for i, (paper_id, paper_info) in enumerate(papers.items()):
+        key = json.dumps(paper_id).encode("ascii")
+        value = json.dumps(paper_info, separators=(",", ":")).encode("ascii")
+        prefix = (b"," if i else b"") + key + b":"
+        parts.append(prefix)
+        parts.append(value)
+        pos += len(prefix)
+        spans[paper_id] = (pos, len(value))
+        pos += len(value)
+    parts.append(b"}")
+    return b"".join(parts), spans
+
+
+class PaperIndex:
+    """
+    In-memory paper_id -> (topic, offset, length) map over all topic directories.
+
+    Each topic keeps a `papers_index.json` sidecar next to its `papers_info.json`,
+    stamped with the mtime/size of the file it describes. At startup the sidecars
+    are loaded (and stale ones rebuilt), so lookups never scan topic directories.
+
+    A paper saved under several topics resolves to the topic whose papers file
+    was written last, both while running and after a rebuild.
+    """
+
+    def __init__(self, paper_dir: str):
+        self.paper_dir = paper_dir
+        self._lock = threading.RLock()
+        self._papers: Dict[str, Tuple[str, int, int]] = {}
+        self._topic_ids: Dict[str, List[str]] = {}
+        self._topic_stats: Dict[str, Tuple[int, int]] = {}
+        # (paper_dir mtime, monotonic time) of the last refresh()
+        self._scanned: Tuple[Optional[int], float] = (None, float("-inf"))
+
+    def _papers_path(self, topic: str) -> str:
+        return os.path.join(self.paper_dir, topic, PAPERS_FILE)
+
+    def _sidecar_path(self, topic: str) -> str:
+        return os.path.join(self.paper_dir, topic, INDEX_FILE)
+
+    def _set_topic(self, topic: str, stat: Tuple[int, int], spans: Dict[str, Tuple[int, int]]):
+        with self._lock:
+            for paper_id in self._topic_ids.get(topic, []):
+                if self._papers.get(paper_id, (None,))[0] == topic:
+                    del self._papers[paper_id]
+            for paper_id, (offset, length) in spans.items():
+                owner = self._papers.get(paper_id, (topic,))[0]
+                if owner != topic and self._topic_stats.get(owner, (0,))[0] > stat[0]:
+                    continue  # a more recently written topic holds this paper
+                self._papers[paper_id] = (topic, offset, length)
+            self._topic_ids[topic] = list(spans)
+            self._topic_stats[topic] = stat
+
+    def _write_sidecar(self, topic: str, stat: Tuple[int, int], spans: Dict[str, Tuple[int, int]]):
+        sidecar = self._sidecar_path(topic)
+        tmp_path = f"{sidecar}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"mtime_ns": stat[0], "size": stat[1], "papers": spans}, f)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            logger.warning("Could not persist paper index for %s: %s", topic, e)
+
+    def _file_stat(self, topic: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self._papers_path(topic))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def update_topic(self, topic: str, data: bytes, spans: Optional[Dict[str, Tuple[int, int]]] = None):
+        """
+        Record the contents just written to a topic's papers file.
+
+        Args:
+            topic: Topic directory name
+            data: The exact bytes written to papers_info.json
+            spans: Value spans in `data`, if the writer already knows them
+        """
+        if spans is None:
+            spans = scan_offsets(data)
+        stat = self._file_stat(topic)
+        if stat is None:
+            return
+        self._set_topic(topic, stat, spans)
+        self._write_sidecar(topic, stat, spans)
+
+    def index_topic(self, topic: str):
+        """Re-read one topic's papers file and rebuild its index entries."""
+        file_path = self._papers_path(topic)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            stat = self._file_stat(topic)
+            spans = scan_offsets(data)
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping unreadable papers file %s: %s", file_path, e)
+            self._set_topic(topic, (0, 0), {})
+            return
+        self._set_topic(topic, stat, spans)
+        self._write_sidecar(topic, stat, spans)
+
+    def _load_topic(self, topic: str):
+        stat = self._file_stat(topic)
+        if stat is None:
+            return
+        try:
+            with open(self._sidecar_path(topic), "r") as f:
+                sidecar = json.load(f)
+            if (sidecar["mtime_ns"], sidecar["size"]) == stat:
+                spans = {k: tuple(v) for k, v in sidecar["papers"].items()}
+                self._set_topic(topic, stat, spans)
+                return
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        self.index_topic(topic)
+
+    def refresh(self):
+        """Pick up topics that were added or changed on disk since the last scan."""
+        try:
+            dir_mtime = os.stat(self.paper_dir).st_mtime_ns
+        except FileNotFoundError:
+            return
+        self._scanned = (dir_mtime, time.monotonic())
+        for topic in os.listdir(self.paper_dir):
+            if os.path.isdir(os.path.join(self.paper_dir, topic)):
+                stat = self._file_stat(topic)
+                if stat is not None and self._topic_stats.get(topic) != stat:
+                    self._load_topic(topic)
+
+    def rebuild(self):
+        """Load the index for every topic directory under paper_dir (run once at startup)."""
+        with self._lock:
+            self._papers.clear()
+            self._topic_ids.clear()
+            self._topic_stats.clear()
+        self.refresh()
+        logger.info("Paper index ready: %d papers across %d topics", len(self._papers), len(self._topic_ids))
+
+    def _refresh_after_miss(self) -> bool:
+        """
+        Rescan for papers another process may have written, unless that was done
+        moments ago. Misses in between cost one stat instead of one per topic.
+
+        Returns:
+            True if the index was refreshed (so a second lookup is worthwhile)
+        """
+        try:
+            dir_mtime = os.stat(self.paper_dir).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        scanned_mtime, scanned_at = self._scanned
+        if dir_mtime == scanned_mtime and time.monotonic() - scanned_at < INDEX_MISS_REFRESH_SECONDS:
+            return False
+        self.refresh()
+        return True
+
+    def _read_entry(self, paper_id: str) -> Optional[dict]:
+        entry = self._papers.get(paper_id)
+        if entry is None:
+            return None
+        if self._file_stat(entry[0]) != self._topic_stats.get(entry[0]):
+            # The file changed behind our back (another process wrote it)
+            self._load_topic(entry[0])
+        for _ in range(2):
+            entry = self._papers.get(paper_id)
+            if entry is None:
+                return None
+            topic, offset, length = entry
+            try:
+                with open(self._papers_path(topic), "rb") as f:
+                    f.seek(offset)
+                    return json.loads(f.read(length))
+            except (OSError, ValueError):
+                # Replaced between the stat and the read: index the new file and read once more
+                self.index_topic(topic)
+        return None
+
+    def _read_many(self, paper_ids: List[str]) -> Dict[str, dict]:
+        by_topic: Dict[str, List[str]] = {}
+        for paper_id in paper_ids:
+            entry = self._papers.get(paper_id)
+            if entry is not None:
+                by_topic.setdefault(entry[0], []).append(paper_id)
+
+        found = {}
+        for topic, topic_ids in by_topic.items():
+            if self._file_stat(topic) != self._topic_stats.get(topic):
+                self._load_topic(topic)
+            for _ in range(2):
+                try:
+                    # One open per topic file, then a seek + read per paper
+                    with open(self._papers_path(topic), "rb") as f:
+                        for paper_id in topic_ids:
+                            entry = self._papers.get(paper_id)
+                            if entry is None or entry[0] != topic or paper_id in found:
+                                continue
+                            f.seek(entry[1])
+                            found[paper_id] = json.loads(f.read(entry[2]))
+                    break
+                except (OSError, ValueError):
+                    # Replaced between the stat and the read: index the new file and read once more
+                    self.index_topic(topic)
+        return found
+
+    def lookup_many(self, paper_ids: List[str]) -> Dict[str, dict]:
+        """
+        Batch version of lookup(): {paper_id: info} for the IDs that are stored.
+        """
+        found = self._read_many(paper_ids)
+        missing = [paper_id for paper_id in paper_ids if paper_id not in found]
+        if missing and self._refresh_after_miss():
+            found.update(self._read_many(missing))
+        return found
+
+    def topic_size(self, topic: str) -> Optional[int]:
+        """
+        Number of papers in a topic's file, re-indexing it first if it changed on disk.
+
+        Returns:
+            Paper count, or None if the topic has no papers file
+        """
+        stat = self._file_stat(topic)
+        if stat is None:
+            return None
+        if self._topic_stats.get(topic) != stat:
+            self._load_topic(topic)
+        return len(self._topic_ids.get(topic, []))
+
+    def lookup(self, paper_id: str) -> Optional[dict]:
+        """
+        Return the stored info for a paper ID, or None if it is not in any topic.
+        """
+        paper_info = self._read_entry(paper_id)
+        # A miss may just mean another process wrote a topic we haven't seen yet
+        if paper_info is None and self._refresh_after_miss():
+            paper_info = self._read_entry(paper_id)
+        return paper_info
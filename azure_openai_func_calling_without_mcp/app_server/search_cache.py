@@ -0,0 +1,119 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from metrics import counter_callback, gauge_callback
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))  # seconds
+
+# A search result is the ordered list of (paper_id, paper_info) pairs arXiv returned
+SearchResults = List[Tuple[str, dict]]
+
+
+class PartialResults(list):
+    """
+    Results of a search that stopped early (arXiv kept sending an empty page
+    mid-result set). They are served as they are but never cached, since a
+    short cached entry would be taken to mean arXiv has no more results.
+    """
+
+
+def normalize_topic(topic: str) -> str:
+    """Case- and whitespace-insensitive cache key for a topic."""
+    return " ".join(topic.lower().split())
+
+
+class SearchCache:
+    """
+    Bounded TTL + LRU cache of arXiv search results.
+
+    Entries are keyed on (normalized topic, sort). An entry fetched with a
+    larger max_results also answers smaller requests by returning a prefix,
+    and an entry that came back short (arXiv ran out of results) answers
+    any max_results.
+    """
+
+    def __init__(self, maxsize: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at, requested max_results, results)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int, SearchResults]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, topic: str, max_results: int, sort: str = "relevance") -> Optional[SearchResults]:
+        """
+        Return cached results for this search, or None on a miss.
+        """
+        key = (normalize_topic(topic), sort)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, requested, results = entry
+                if expires_at <= self._clock():
+                    del self._entries[key]
+                    self.expirations += 1
+                elif requested >= max_results or len(results) < requested:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return results[:max_results]
+            self.misses += 1
+            return None
+
+    def put(self, topic: str, max_results: int, results: SearchResults, sort: str = "relevance"):
+        """
+        Store results for this search, keeping the wider of two live entries.
+        PartialResults are ignored.
+        """
+        if isinstance(results, PartialResults):
+            return
+        key = (normalize_topic(topic), sort)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] > max_results:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (now + self.ttl, max_results, list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Process-wide cache shared by every search_papers entry point
+search_cache = SearchCache()
+
+counter_callback("search_cache_hits_total", "Searches answered from the result cache", lambda: search_cache.hits)
+counter_callback("search_cache_misses_total", "Searches that had to go to arXiv", lambda: search_cache.misses)
+counter_callback("search_cache_evictions_total", "Entries evicted to stay under SEARCH_CACHE_SIZE",
+                 lambda: search_cache.evictions)
+counter_callback("search_cache_expirations_total", "Entries dropped after SEARCH_CACHE_TTL",
+                 lambda: search_cache.expirations)
+gauge_callback("search_cache_entries", "Searches currently cached", lambda: len(search_cache._entries))
+gauge_callback("search_cache_hit_ratio", "Hits / (hits + misses) since start",
+               lambda: search_cache.hits / max(1, search_cache.hits + search_cache.misses))
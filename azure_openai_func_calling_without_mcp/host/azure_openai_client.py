@@ -1,9 +1,17 @@
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 from openai import AzureOpenAI
 from dotenv import load_dotenv
-from tools_client import tools_schema, search_papers, extract_info, system_prompt
+from tools_client import (
+    tools_schema, search_papers, extract_info, search_papers_batch, extract_info_batch, search_local, search_similar, system_prompt
+)
 from logger_config import logger
+from logging_setup import clip
+from chat_stream import StreamPrinter, stream_completion
+from conversation_memory import ConversationMemory, get_token_counter
+from result_shaping import shape_result
+from tracing import configure as configure_tracing, in_current_context, span
 
 load_dotenv()
 
@@ -14,10 +22,177 @@ client = AzureOpenAI(
 )
 
 deployment_name = os.getenv("MODEL_NAME")
+configure_tracing("azure-openai-host")
+
+tool_functions = {
+    "search_papers": search_papers,
+    "extract_info": extract_info,
+    "search_papers_batch": search_papers_batch,
+    "extract_info_batch": extract_info_batch,
+    "search_local": search_local,
+    "search_similar": search_similar,
+}
+
+# Tool calls from one assistant message are dispatched concurrently
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "8"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+# Print replies token by token as they stream in (CHAT_STREAMING=0 waits for the full reply)
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "1") == "1"
+
+count_tokens = get_token_counter()
+
+def run_tool_call(tool_call):
+    """Run one tool call; failures (bad arguments included) become an {"error": ...} result."""
+    tool_name = tool_call.function.name
+
+    with span(f"tool {tool_name}"):
+        try:
+            function_args = json.loads(tool_call.function.arguments)
+            logger.info("🛠️ Tool called: %s with args: %s", tool_name, function_args)
+            print(f"🔧 Tool called: {tool_name} with args: {function_args}")
+
+            if tool_name in tool_functions:
+                tool_response = tool_functions[tool_name](**function_args)
+            else:
+                tool_response = {"error": "Unknown tool"}
+        except Exception as e:
+            logger.exception("❌ Tool call %s failed: %s", tool_name, e)
+            tool_response = {"error": str(e)}
+
+        logger.info("📤 Tool response: %s", clip(tool_response))
+
+        # Minified, projected JSON instead of a repr / pretty-printed payload
+        shaped = shape_result(tool_response, count_tokens)
+        logger.info("✂️ %s result: %s tokens (%s saved)", tool_name, shaped.tokens, shaped.saved)
+        return shaped.text
+
+def request_messages(memory):
+    # Compact old tool results / turns so the request stays under the token budget
+    saved = memory.fit()
+    if saved:
+        logger.info("🧠 Conversation memory compacted: saved %s tokens, now %s/%s", saved, memory.tokens, memory.budget)
+    return memory.messages
+
+
+def chat_turn_blocking(memory):
+    with span("llm.chat", model=deployment_name):
+        response = client.chat.completions.create(
+            model=deployment_name,
+            messages=request_messages(memory),
+            tools=tools_schema,
+            tool_choice="auto"
+        )
+
+    response_message = response.choices[0].message
+
+    if response_message.tool_calls:
+        tool_calls = response_message.tool_calls
+
+        # Run every tool call from this assistant message at once
+        futures = [tool_executor.submit(in_current_context(run_tool_call), tool_call) for tool_call in tool_calls]
+        tool_responses = [future.result() for future in futures]
+
+        memory.append({
+            "role": "assistant",
+            "content": response_message.content,
+            "tool_calls": tool_calls,
+        })
+        for tool_call, tool_response in zip(tool_calls, tool_responses):
+            memory.append({
+                "tool_call_id": tool_call.id,
+                "role": "tool",
+                "name": tool_call.function.name,
+                "content": tool_response,
+            })
+
+        # One follow-up completion for the whole batch of tool results
+        with span("llm.chat", model=deployment_name):
+            follow_up = client.chat.completions.create(
+                model=deployment_name,
+                messages=request_messages(memory)
+            )
+        final_msg = follow_up.choices[0].message
+        print(f"🤖 Bot: {final_msg.content}\n")
+        logger.info("🤖 Final bot message: %s", clip(final_msg.content))
+        memory.append({"role": "assistant", "content": final_msg.content})
+
+    else:
+        print(f"🤖 Bot: {response_message.content}\n")
+        logger.info("🤖 Bot message (no tool): %s", clip(response_message.content))
+        memory.append({"role": "assistant", "content": response_message.content})
+
+
+def log_turn_stats(turn):
+    if turn.ttft is not None:
+        logger.info("⏱️ TTFT: %.2fs, %.1f tokens/sec (%s tokens)",
+                    turn.ttft, turn.tokens_per_sec, turn.completion_tokens)
+
+
+def chat_turn_streaming(memory):
+    # Tools start as soon as their streamed arguments are complete
+    pending = {}
+
+    def start_tool(tool_call):
+        # Tool threads stay under this turn's trace
+        pending[tool_call.index] = tool_executor.submit(in_current_context(run_tool_call), tool_call)
+
+    printer = StreamPrinter()
+    with span("llm.chat", model=deployment_name):
+        turn = stream_completion(
+            client,
+            on_text=printer,
+            on_tool_call=start_tool,
+            model=deployment_name,
+            messages=request_messages(memory),
+            tools=tools_schema,
+            tool_choice="auto"
+        )
+    printer.finish()
+    log_turn_stats(turn)
+
+    if not turn.tool_calls:
+        logger.info("🤖 Bot message (no tool): %s", clip(turn.content))
+        memory.append({"role": "assistant", "content": turn.content})
+        return
+
+    # Collect every result before touching memory, so it never holds unanswered tool_calls
+    tool_responses = [pending[tool_call.index].result() for tool_call in turn.tool_calls]
+    memory.append({
+        "role": "assistant",
+        "content": turn.content or None,
+        "tool_calls": [tool_call.to_dict() for tool_call in turn.tool_calls],
+    })
+    for tool_call, tool_response in zip(turn.tool_calls, tool_responses):
+        memory.append({
+            "tool_call_id": tool_call.id,
+            "role": "tool",
+            "name": tool_call.function.name,
+            "content": tool_response,
+        })
+
+    printer = StreamPrinter()
+    with span("llm.chat", model=deployment_name):
+        follow_up = stream_completion(client, on_text=printer, model=deployment_name,
+                                      messages=request_messages(memory))
+    printer.finish()
+    log_turn_stats(follow_up)
+    logger.info("🤖 Final bot message: %s", clip(follow_up.content))
+    memory.append({"role": "assistant", "content": follow_up.content})
+
+
+def chat_turn(memory):
+    # One trace per turn; its flame summary shows where the time went
+    with span("chat_turn", summary=True, streaming=CHAT_STREAMING):
+        if CHAT_STREAMING:
+            chat_turn_streaming(memory)
+        else:
+            chat_turn_blocking(memory)
+
 
 def chatbot():
     logger.info("🔁 Chatbot session started.")
-    messages = [{"role": "system", "content": system_prompt}]
+    memory = ConversationMemory(system_prompt, count_tokens=count_tokens)
 
     while True:
         user_input = input("You: ").strip()
@@ -26,61 +201,10 @@ def chatbot():
             logger.info("👋 User exited chat session.")
             break
 
-        logger.info(f"📥 User input: {user_input}")
-        messages.append({"role": "user", "content": user_input})
-
-        response = client.chat.completions.create(
-            model=deployment_name,
-            messages=messages,
-            tools=tools_schema,
-            tool_choice="auto"
-        )
-
-        response_message = response.choices[0].message
-
-        if response_message.tool_calls:
-            for tool_call in response_message.tool_calls:
-                tool_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-
-                logger.info(f"🛠️ Tool called: {tool_name} with args: {function_args}")
-                print(f"🔧 Tool called: {tool_name} with args: {function_args}")
-
-                if tool_name == "search_papers":
-                    tool_response = search_papers(**function_args)
-                elif tool_name == "extract_info":
-                    tool_response = extract_info(**function_args)
-                else:
-                    tool_response = {"error": "Unknown tool"}
-
-                logger.info(f"📤 Tool response: {tool_response}")
-
-                messages.append({
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [tool_call],
-                })
-
-                messages.append({
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "name": tool_name,
-                    "content": json.dumps(tool_response),
-                })
-
-                follow_up = client.chat.completions.create(
-                    model=deployment_name,
-                    messages=messages
-                )
-                final_msg = follow_up.choices[0].message
-                print(f"🤖 Bot: {final_msg.content}\n")
-                logger.info(f"🤖 Final bot message: {final_msg.content}")
-                messages.append({"role": "assistant", "content": final_msg.content})
+        logger.info("📥 User input: %s", user_input)
+        memory.append({"role": "user", "content": user_input})
 
-        else:
-            print(f"🤖 Bot: {response_message.content}\n")
-            logger.info(f"🤖 Bot message (no tool): {response_message.content}")
-            messages.append({"role": "assistant", "content": response_message.content})
+        chat_turn(memory)
 
 if __name__ == '__main__':
     chatbot()
\ No newline at end of file
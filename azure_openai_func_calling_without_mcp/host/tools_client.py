@@ -1,12 +1,20 @@
 import os
 import json
-import requests
+from http_transport import Transport
 
 PAPER_SERVER_API = os.getenv("PAPER_SERVER_API", "http://app_server:8001")
 
+# Pooled keep-alive connections with timeouts, retries and a circuit breaker
+app_server = Transport("app_server", PAPER_SERVER_API)
+# Larger searches return the first streamed page; the server stores the rest in the background
+SEARCH_EARLY_RETURN = int(os.getenv("SEARCH_EARLY_RETURN", "10"))
+
 system_prompt = (
     "You are a helpful assistant who can search academic papers using the 'search_papers' tool, "
-    "and provide detailed info using 'extract_info'. Always use a tool when it's helpful."
+    "and provide detailed info using 'extract_info'. Try 'search_local' first to find papers that are "
+    "already stored. When you need several topics or papers, "
+    "use 'search_papers_batch' or 'extract_info_batch' once instead of repeating the single tools. "
+    "Always use a tool when it's helpful."
 )
 
 tools_schema = [
@@ -48,19 +56,152 @@ tools_schema = [
                 "required": ["paper_id"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_local",
+            "description": "Full-text search over papers already stored locally (fast, no arXiv call)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Keywords to look for in titles, summaries and authors"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Max number of papers to return",
+                        "default": 10
+                    }
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_similar",
+            "description": "Find stored papers similar to a text or to a stored paper (embedding similarity over stored abstracts, no arXiv call)",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Text to find similar papers for"
+                    },
+                    "paper_id": {
+                        "type": "string",
+                        "description": "arXiv ID of a stored paper to find similar papers for (instead of query)"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Max number of papers to return",
+                        "default": 10
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_papers_batch",
+            "description": "Search for papers on arXiv for several topics in one call",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "topics": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The topics to search papers for"
+                    },
+                    "max_results": {
+                        "type": "integer",
+                        "description": "Max number of papers to return per topic",
+                        "default": 5
+                    }
+                },
+                "required": ["topics"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "extract_info_batch",
+            "description": "Get info about several papers by their arXiv IDs in one call",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "paper_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "The arXiv IDs of the papers"
+                    }
+                },
+                "required": ["paper_ids"]
+            }
+        }
     }
 ]
 
 def search_papers(topic: str, max_results: int = 5):
     try:
-        response = requests.get(f"{PAPER_SERVER_API}/search_papers", params={"topic": topic, "max_results": max_results})
+        if max_results > SEARCH_EARLY_RETURN:
+            return search_papers_first_page(topic, max_results)
+        response = app_server.get("/search_papers", params={"topic": topic, "max_results": max_results})
         return response.json()
     except Exception as e:
         return {"error": f"Failed to call search_papers API: {str(e)}"}
 
+def search_papers_first_page(topic: str, max_results: int):
+    """Read the first page of /search_papers/stream and hang up; the server keeps storing the rest."""
+    with app_server.get("/search_papers/stream", params={"topic": topic, "max_results": max_results},
+                        stream=True) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            page = json.loads(line)
+            if "error" in page:
+                return page
+            return page.get("paper_ids", [])
+    return []
+
 def extract_info(paper_id: str):
     try:
-        response = requests.get(f"{PAPER_SERVER_API}/extract_info", params={"paper_id": paper_id})
+        response = app_server.get("/extract_info", params={"paper_id": paper_id})
+        return response.json()
+    except Exception as e:
+        return {"error": f"Failed to call extract_info API: {str(e)}"}
+
+def search_local(query: str, limit: int = 10):
+    try:
+        response = app_server.get("/search_local", params={"query": query, "limit": limit})
+        return response.json()
+    except Exception as e:
+        return {"error": f"Failed to call search_local API: {str(e)}"}
+
+def search_similar(query: str = "", paper_id: str = "", limit: int = 10):
+    try:
+        response = app_server.get("/search_similar", params={"query": query, "paper_id": paper_id, "limit": limit})
+        return response.json()
+    except Exception as e:
+        return {"error": f"Failed to call search_similar API: {str(e)}"}
+
+def search_papers_batch(topics: list, max_results: int = 5):
+    try:
+        # Re-running a search only upserts the same papers, so retries are safe
+        response = app_server.post("/search_papers", json={"topics": topics, "max_results": max_results},
+                                   idempotent=True)
+        return response.json()
+    except Exception as e:
+        return {"error": f"Failed to call search_papers batch API: {str(e)}"}
+
+def extract_info_batch(paper_ids: list):
+    try:
+        response = app_server.post("/extract_info", json={"paper_ids": paper_ids}, idempotent=True)
         return response.json()
     except Exception as e:
-        return {"error": f"Failed to call extract_info API: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Failed to call extract_info batch API: {str(e)}"}
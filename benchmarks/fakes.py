@@ -0,0 +1,277 @@
+"""
+Local stand-ins for the upstream services, so benchmarks never call the real
+arXiv, Azure OpenAI or Ollama APIs.
+
+    python benchmarks/fakes.py arxiv --port 9100 --latency-ms 50
+    python benchmarks/fakes.py openai --port 9101 --latency-ms 100 --token-delay-ms 5
+    python benchmarks/fakes.py ollama --port 9102 --latency-ms 100 --token-delay-ms 5
+
+Every fake waits `latency-ms` (± `jitter-ms`) before its first byte and can
+fail a share of requests with 503 (`error-rate`). The LLM fakes follow a
+fixed script: a user message is answered with one search_papers tool call
+for the message text, and a tool result is answered with `reply-tokens`
+tokens of text, streamed `token-delay-ms` apart.
+"""
+import json
+import time
+import zlib
+import random
+import asyncio
+import argparse
+from typing import AsyncIterator, Optional
+from xml.sax.saxutils import escape
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+SUMMARY_WORDS = ("retrieval augmented generation agents benchmark evaluation language models "
+                 "reasoning tools planning memory latency throughput dataset training").split()
+
+
+class Latency:
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, token_delay_ms: float = 0,
+                 error_rate: float = 0, seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    async def wait(self):
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    async def between_tokens(self):
+        if self.token_delay > 0:
+            await asyncio.sleep(self.token_delay)
+
+
+def _unavailable() -> Response:
+    return JSONResponse({"error": "injected failure"}, status_code=503)
+
+
+# ---- arXiv -------------------------------------------------------------------
+
+def paper_id(query: str, index: int) -> str:
+    """Stable, query-specific arXiv-style ID, so different topics never share papers."""
+    prefix = 1000 + zlib.crc32(query.encode("utf-8")) % 9000
+    return f"{prefix}.{index:05d}v1"
+
+
+def atom_entry(query: str, index: int, summary_words: int) -> str:
+    short_id = paper_id(query, index)
+    rng = random.Random(f"{query}:{index}")
+    summary = " ".join(rng.choice(SUMMARY_WORDS) for _ in range(summary_words))
+    return (
+        f"<entry><id>http://arxiv.org/abs/{short_id}</id>"
+        f"<published>2025-01-15T00:00:00Z</published><updated>2025-01-15T00:00:00Z</updated>"
+        f"<title>{escape(query)}: study {index}</title>"
+        f"<summary>{summary}</summary>"
+        f"<author><name>Author {index % 97}</name></author><author><name>Author {index % 89 + 100}</name></author>"
+        f'<link href="http://arxiv.org/abs/{short_id}" rel="alternate" type="text/html"/>'
+        f'<link title="pdf" href="http://arxiv.org/pdf/{short_id}" rel="related" type="application/pdf"/>'
+        f'<arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.CL"/>'
+        f'<category term="cs.CL" scheme="http://arxiv.org/schemas/atom"/>'
+        f"</entry>"
+    )
+
+
+def arxiv_app(latency: Latency, total_results: int = 1000, summary_words: int = 150) -> Starlette:
+    """GET /api/query with the same Atom feed shape (and paging) as export.arxiv.org."""
+
+    async def query(request: Request) -> Response:
+        await latency.wait()
+        if latency.should_fail():
+            return _unavailable()
+        params = request.query_params
+        search = params.get("search_query", "") or params.get("id_list", "")
+        start = int(params.get("start", 0))
+        size = int(params.get("max_results", 10))
+        count = max(0, min(size, total_results - start))
+        entries = "".join(atom_entry(search, start + i, summary_words) for i in range(count))
+        feed = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            f"<title>arXiv Query: {escape(search)}</title>"
+            f"<opensearch:totalResults>{total_results}</opensearch:totalResults>"
+            f"<opensearch:startIndex>{start}</opensearch:startIndex>"
+            f"<opensearch:itemsPerPage>{size}</opensearch:itemsPerPage>"
+            f"{entries}</feed>"
+        )
+        return Response(feed, media_type="application/atom+xml")
+
+    return Starlette(routes=[Route("/api/query", query)])
+
+
+# ---- LLMs --------------------------------------------------------------------
+
+def _reply_tokens(count: int) -> list:
+    return [f"{SUMMARY_WORDS[i % len(SUMMARY_WORDS)]} " for i in range(count)]
+
+
+def _last_user_text(messages: list) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            return str(message.get("content") or "")
+    return ""
+
+
+def _wants_tool(messages: list, has_tools: bool) -> bool:
+    # Script: call a tool for a fresh user message, answer once a tool result is in
+    return has_tools and bool(messages) and messages[-1].get("role") == "user"
+
+
+def openai_app(latency: Latency, reply_tokens: int = 50, tool_max_results: int = 5) -> Starlette:
+    """OpenAI / Azure OpenAI chat completions, streamed (SSE) or not, with scripted tool calls."""
+
+    async def completions(request: Request) -> Response:
+        await latency.wait()
+        if latency.should_fail():
+            return _unavailable()
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model") or request.path_params.get("deployment", "fake")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{created}{random.randrange(10**6)}"
+        prompt_tokens = sum(len(str(message.get("content") or "")) // 4 for message in messages)
+
+        tool_call = None
+        tokens = []
+        if _wants_tool(messages, bool(body.get("tools"))):
+            arguments = json.dumps({"topic": _last_user_text(messages), "max_results": tool_max_results})
+            tool_call = {"id": f"call_{completion_id[-8:]}", "type": "function",
+                         "function": {"name": "search_papers", "arguments": arguments}}
+        else:
+            tokens = _reply_tokens(reply_tokens)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens) or 20,
+                 "total_tokens": prompt_tokens + (len(tokens) or 20)}
+        finish_reason = "tool_calls" if tool_call else "stop"
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": "".join(tokens) if tokens else None}
+            if tool_call:
+                message["tool_calls"] = [tool_call]
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        def chunk(delta: dict, finish: Optional[str] = None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }) + "\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_call:
+                # Arguments arrive in fragments, like the real API
+                arguments = tool_call["function"]["arguments"]
+                yield chunk({"tool_calls": [{"index": 0, "id": tool_call["id"], "type": "function",
+                                             "function": {"name": "search_papers", "arguments": ""}}]})
+                for start in range(0, len(arguments), 16):
+                    await latency.between_tokens()
+                    yield chunk({"tool_calls": [{"index": 0, "function": {"arguments": arguments[start:start + 16]}}]})
+            for token in tokens:
+                await latency.between_tokens()
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                    "model": model, "choices": [], "usage": usage,
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[
+        Route("/openai/deployments/{deployment}/chat/completions", completions, methods=["POST"]),
+        Route("/v1/chat/completions", completions, methods=["POST"]),
+        Route("/chat/completions", completions, methods=["POST"]),
+    ])
+
+
+def ollama_app(latency: Latency, reply_tokens: int = 50, tool_max_results: int = 5) -> Starlette:
+    """Ollama /api/chat as an NDJSON stream (or one JSON object), with scripted function calls."""
+
+    async def chat(request: Request) -> Response:
+        await latency.wait()
+        if latency.should_fail():
+            return _unavailable()
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "fake")
+        prompt_eval_count = sum(len(str(message.get("content") or "")) // 4 for message in messages)
+
+        function_call = None
+        tokens = []
+        if _wants_tool(messages, bool(body.get("functions"))):
+            function_call = {"name": "search_papers",
+                             "arguments": {"topic": _last_user_text(messages), "max_results": tool_max_results}}
+        else:
+            tokens = _reply_tokens(reply_tokens)
+
+        def done_chunk() -> dict:
+            final = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                     "prompt_eval_count": prompt_eval_count, "eval_count": len(tokens) or 20,
+                     "total_duration": 0, "eval_duration": 0}
+            if function_call:
+                final["function_call"] = function_call
+            return final
+
+        if body.get("stream") is False:
+            final = done_chunk()
+            final["message"]["content"] = "".join(tokens)
+            return JSONResponse(final)
+
+        async def lines() -> AsyncIterator[bytes]:
+            for token in tokens:
+                await latency.between_tokens()
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": token},
+                                  "done": False}).encode("utf-8") + b"\n"
+            yield json.dumps(done_chunk()).encode("utf-8") + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def tags(request: Request) -> Response:
+        return JSONResponse({"models": [{"name": "fake:latest"}]})
+
+    return Starlette(routes=[Route("/api/chat", chat, methods=["POST"]), Route("/api/tags", tags)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake upstream service for benchmarks")
+    parser.add_argument("service", choices=["arxiv", "openai", "ollama"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency-ms", type=float, default=50, help="delay before the first byte")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform ± jitter on the delay")
+    parser.add_argument("--token-delay-ms", type=float, default=5, help="delay between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--total-results", type=int, default=1000, help="arXiv results per query")
+    parser.add_argument("--summary-words", type=int, default=150, help="words per arXiv abstract")
+    parser.add_argument("--reply-tokens", type=int, default=50, help="tokens in a text reply")
+    parser.add_argument("--tool-max-results", type=int, default=5, help="max_results in scripted tool calls")
+    args = parser.parse_args()
+
+    latency = Latency(args.latency_ms, args.jitter_ms, args.token_delay_ms, args.error_rate, args.seed)
+    if args.service == "arxiv":
+        app = arxiv_app(latency, args.total_results, args.summary_words)
+    elif args.service == "openai":
+        app = openai_app(latency, args.reply_tokens, args.tool_max_results)
+    else:
+        app = ollama_app(latency, args.reply_tokens, args.tool_max_results)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Drive one host chat loop for a number of scripted turns and report timings.
+
+Run by run.py in its own process (each host has its own module set and reads
+its configuration from the environment at import time):
+
+    python benchmarks/host_driver.py ollama --turns 20 --output turns.json
+
+Each turn asks about a new topic, so with the fake LLMs every turn is one
+tool round (search_papers) plus a streamed answer.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST_DIRS = {
+    "ollama": os.path.join(ROOT, "ollama_function_calling_without_mcp", "host"),
+    "azure": os.path.join(ROOT, "azure_openai_func_calling_without_mcp", "host"),
+    "azure-mcp": os.path.join(ROOT, "azure_openai_func_calling_with_mcp"),
+}
+
+
+def run_ollama(turns: int, prefix: str) -> dict:
+    import llama_client
+
+    turn_seconds, first_token_seconds, errors = [], [], 0
+    for i in range(turns):
+        started = time.perf_counter()
+        first_token = None
+        try:
+            for _ in llama_client.stream_query(f"{prefix} topic {i}"):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+        except Exception as e:
+            errors += 1
+            print(f"turn {i} failed: {e}", file=sys.stderr)
+            continue
+        turn_seconds.append(time.perf_counter() - started)
+        if first_token is not None:
+            first_token_seconds.append(first_token)
+    return {"turn_seconds": turn_seconds, "first_token_seconds": first_token_seconds, "errors": errors}
+
+
+def run_azure(turns: int, prefix: str) -> dict:
+    import azure_openai_client as client
+    from conversation_memory import ConversationMemory
+
+    memory = ConversationMemory(client.system_prompt, count_tokens=client.count_tokens)
+    turn_seconds, errors = [], 0
+    for i in range(turns):
+        memory.append({"role": "user", "content": f"{prefix} topic {i}"})
+        started = time.perf_counter()
+        try:
+            # The host prints the reply as it streams; keep stdout for the report
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                client.chat_turn(memory)
+        except Exception as e:
+            errors += 1
+            print(f"turn {i} failed: {e}", file=sys.stderr)
+            continue
+        turn_seconds.append(time.perf_counter() - started)
+    return {"turn_seconds": turn_seconds, "errors": errors, "history_tokens": memory.tokens}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time scripted turns through a host chat loop")
+    parser.add_argument("host", choices=sorted(HOST_DIRS))
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--prefix", default="bench", help="topic prefix, so runs do not share cached searches")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    sys.path.insert(0, HOST_DIRS[args.host])
+    started = time.perf_counter()
+    report = run_ollama(args.turns, args.prefix) if args.host == "ollama" else run_azure(args.turns, args.prefix)
+    report["host"] = args.host
+    report["wall_seconds"] = time.perf_counter() - started
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+    else:
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
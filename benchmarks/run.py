@@ -0,0 +1,508 @@
+"""
+Scripted load scenarios against the app servers, the MCP server and the host
+chat loops, with local fakes standing in for arXiv, Azure OpenAI and Ollama.
+
+    python benchmarks/run.py                          # every suite, default load
+    python benchmarks/run.py --suite app --requests 500 --concurrency 32
+    python benchmarks/run.py --output results.json --baseline previous.json
+
+Servers and fakes are started as subprocesses in a scratch directory, so the
+source tree and its paper data are never touched. To benchmark servers that
+are already running instead, point the usual variables at them:
+APP_SERVER_URL (Ollama app server), PAPER_SERVER_API (Azure app server),
+MCP_SERVER_URL, and ARXIV_API_URL / AZURE_OPENAI_ENDPOINT / OLLAMA_BASE_URL
+for the upstreams.
+
+The report is JSON: one entry per (target, scenario) with p50/p95/p99/mean/
+max latency in milliseconds, throughput in requests per second and the
+error count. With --baseline, entries whose p95 grew by more than
+--max-regression are listed and the exit status is 1.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+COMPONENTS = {
+    "ollama-app": os.path.join(ROOT, "ollama_function_calling_without_mcp", "app_server"),
+    "azure-app": os.path.join(ROOT, "azure_openai_func_calling_without_mcp", "app_server"),
+    "mcp": os.path.join(ROOT, "azure_openai_func_calling_with_mcp"),
+}
+# Already-running servers to benchmark instead of starting our own
+EXTERNAL_URLS = {
+    "ollama-app": os.getenv("APP_SERVER_URL"),
+    "azure-app": os.getenv("PAPER_SERVER_API"),
+    "mcp": os.getenv("MCP_SERVER_URL"),
+}
+MCP_LAUNCH = (
+    "import sys, app_server\n"
+    "app_server.mcp.settings.host = '127.0.0.1'\n"
+    "app_server.mcp.settings.port = int(sys.argv[1])\n"
+    "app_server.mcp.run(transport='streamable-http')\n"
+)
+SUITES = ("app", "mcp", "hosts")
+HOSTS = {"ollama": "ollama-app", "azure": "azure-app", "azure-mcp": "mcp"}
+
+
+# ---- statistics ----------------------------------------------------------------
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def summarize(target: str, scenario: str, latencies: List[float], errors: int, wall: float, **extra) -> dict:
+    values = sorted(latencies)
+    result = {
+        "target": target,
+        "scenario": scenario,
+        "count": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+    result.update(extra)
+    print(f"  {target:<14} {scenario:<24} n={result['count']:<5} err={errors:<3} "
+          f"p50={result['p50_ms']:>9.1f}ms p95={result['p95_ms']:>9.1f}ms "
+          f"p99={result['p99_ms']:>9.1f}ms {result['throughput_rps']:>8.1f} req/s", file=sys.stderr)
+    return result
+
+
+async def run_load(calls: List[Callable[[], Awaitable]], concurrency: int):
+    """Run the calls with at most `concurrency` in flight; returns (latencies, errors, wall seconds)."""
+    latencies: List[float] = []
+    errors = 0
+    queue = list(reversed(calls))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            call = queue.pop()
+            started = time.perf_counter()
+            try:
+                await call()
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"    request failed: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(calls))))))
+    return latencies, errors, time.perf_counter() - started
+
+
+# ---- processes -----------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Processes:
+    """Subprocesses started for one run; their output goes to <workdir>/<name>.log."""
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self._procs: List[subprocess.Popen] = []
+
+    def start(self, name: str, cmd: List[str], env: Optional[Dict[str, str]] = None,
+              cwd: Optional[str] = None) -> subprocess.Popen:
+        cwd = cwd or os.path.join(self.workdir, name)
+        os.makedirs(cwd, exist_ok=True)
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        proc = subprocess.Popen(cmd, cwd=cwd, env={**os.environ, **(env or {})},
+                                stdout=log, stderr=subprocess.STDOUT)
+        self._procs.append(proc)
+        return proc
+
+    def stop(self):
+        for proc in self._procs:
+            proc.terminate()
+        for proc in self._procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def wait_ready(url: str, proc: Optional[subprocess.Popen] = None, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"process for {url} exited with status {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_fake(procs: Processes, service: str, args) -> str:
+    port = free_port()
+    cmd = [sys.executable, os.path.join(BENCH_DIR, "fakes.py"), service, "--port", str(port),
+           "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate), "--seed", str(args.seed)]
+    if service == "arxiv":
+        cmd += ["--latency-ms", str(args.arxiv_latency_ms), "--total-results", str(args.arxiv_total_results)]
+    else:
+        cmd += ["--latency-ms", str(args.llm_latency_ms), "--token-delay-ms", str(args.token_delay_ms),
+                "--reply-tokens", str(args.reply_tokens), "--tool-max-results", str(args.max_results)]
+    proc = procs.start(f"fake-{service}", cmd)
+    url = f"http://127.0.0.1:{port}"
+    ready_path = {"arxiv": "/api/query?search_query=ready&max_results=1", "ollama": "/api/tags",
+                  "openai": "/v1/chat/completions"}[service]
+    wait_ready(url + ready_path, proc)
+    return url
+
+
+def start_server(procs: Processes, target: str, arxiv_url: str, args) -> str:
+    if EXTERNAL_URLS[target]:
+        return EXTERNAL_URLS[target]
+    port = free_port()
+    workdir = os.path.join(procs.workdir, target)
+    env = {
+        "PYTHONPATH": COMPONENTS[target],
+        "ARXIV_API_URL": arxiv_url + "/api/query",
+        "ARXIV_RATE": str(args.arxiv_rate),
+        "ARXIV_BURST": str(max(1.0, args.arxiv_rate)),
+        "PAPER_STORE": args.store,
+        "LOG_DIR": workdir,
+        "TRACE_SUMMARY": "0",
+    }
+    if target == "mcp":
+        proc = procs.start(target, [sys.executable, "-c", MCP_LAUNCH, str(port)], env)
+        wait_ready(f"http://127.0.0.1:{port}/metrics", proc)
+        return f"http://127.0.0.1:{port}/mcp"
+    proc = procs.start(target, [sys.executable, "-m", "uvicorn", "app_server:app", "--app-dir", COMPONENTS[target],
+                                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"], env)
+    url = f"http://127.0.0.1:{port}"
+    wait_ready(url + "/health", proc)
+    return url
+
+
+# ---- app server scenarios ------------------------------------------------------
+
+async def app_scenarios(target: str, base_url: str, args, run_id: str) -> List[dict]:
+    results = []
+    topics = [f"bench {run_id} topic {i}" for i in range(args.requests)]
+    paper_ids: List[str] = []
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def get(path: str, **params):
+            response = await client.get(path, params=params)
+            response.raise_for_status()
+            return response.json()
+
+        def search(topic: str, max_results: int, keep_ids: bool = False):
+            async def call():
+                ids = await get("/search_papers", topic=topic, max_results=max_results)
+                if keep_ids:
+                    paper_ids.extend(ids)
+            return call
+
+        async def scenario(name: str, calls: List[Callable[[], Awaitable]], concurrency: int = args.concurrency):
+            latencies, errors, wall = await run_load(calls, concurrency)
+            results.append(summarize(target, name, latencies, errors, wall))
+
+        # Every search misses the cache and goes to (fake) arXiv, then the store
+        await scenario("cold_search", [search(topic, args.max_results, keep_ids=True) for topic in topics])
+        # The same searches again: served from the search cache
+        await scenario("warm_search", [search(topic, args.max_results) for topic in topics])
+
+        # Batch endpoint, MAX_BATCH_TOPICS-sized batches of new topics
+        batches = [[f"bench {run_id} batch {i} topic {j}" for j in range(args.batch_topics)]
+                   for i in range(max(1, args.requests // args.batch_topics))]
+
+        def batch(batch_topics: List[str]):
+            async def call():
+                response = await client.post("/search_papers",
+                                             json={"topics": batch_topics, "max_results": args.max_results})
+                response.raise_for_status()
+            return call
+
+        await scenario("many_topics_batch", [batch(item) for item in batches])
+
+        # Multi-page searches, blocking and streamed (time to the first NDJSON line)
+        large = [f"bench {run_id} large {i}" for i in range(args.large_topics)]
+        await scenario("large_topic", [search(topic, args.large_results) for topic in large],
+                       concurrency=min(args.concurrency, args.large_topics))
+
+        first_page: List[float] = []
+
+        def stream(topic: str):
+            async def call():
+                started = time.perf_counter()
+                first = None
+                async with client.stream("GET", "/search_papers/stream",
+                                         params={"topic": topic, "max_results": args.large_results}) as response:
+                    response.raise_for_status()
+                    async for _ in response.aiter_lines():
+                        if first is None:
+                            first = time.perf_counter() - started
+                if first is not None:
+                    first_page.append(first)
+            return call
+
+        streamed = [f"bench {run_id} large stream {i}" for i in range(args.large_topics)]
+        latencies, errors, wall = await run_load([stream(topic) for topic in streamed],
+                                                 min(args.concurrency, args.large_topics))
+        results.append(summarize(target, "large_topic_stream", latencies, errors, wall))
+        results.append(summarize(target, "large_topic_first_page", first_page, errors, wall))
+
+        # Many writers saving into one topic at once (distinct max_results defeat the cache)
+        shared = f"bench {run_id} shared topic"
+        await scenario("concurrent_writers",
+                       [search(shared, args.max_results + i % 50) for i in range(args.requests)])
+
+        # Read paths over what the run stored
+        ids = paper_ids or ["0000.00000"]
+        await scenario("extract_info", [
+            (lambda paper_id: lambda: get("/extract_info", paper_id=paper_id))(ids[i % len(ids)])
+            for i in range(args.requests)
+        ])
+        words = ["retrieval", "agents", "benchmark", "memory", "latency", "reasoning"]
+        await scenario("search_local", [
+            (lambda query: lambda: get("/search_local", query=query, limit=10))(words[i % len(words)])
+            for i in range(args.requests)
+        ])
+    return results
+
+
+# ---- MCP scenarios -------------------------------------------------------------
+
+async def mcp_scenarios(url: str, args, run_id: str) -> List[dict]:
+    from fastmcp import Client
+
+    results = []
+    topics = [f"bench {run_id} topic {i}" for i in range(args.requests)]
+    paper_ids: List[str] = []
+    clients = [Client(url, timeout=args.timeout) for _ in range(args.concurrency)]
+    free = asyncio.Queue()
+    for client in clients:
+        await client.__aenter__()
+        free.put_nowait(client)
+
+    async def call_tool(name: str, arguments: dict):
+        client = await free.get()
+        try:
+            result = await client.call_tool(name, arguments)
+        finally:
+            free.put_nowait(client)
+        return result
+
+    async def read_resource(uri: str):
+        client = await free.get()
+        try:
+            return await client.read_resource(uri)
+        finally:
+            free.put_nowait(client)
+
+    def search(topic: str, max_results: int, keep_ids: bool = False):
+        async def call():
+            result = await call_tool("search_papers", {"topic": topic, "max_results": max_results})
+            if keep_ids and isinstance(result.data, list):
+                paper_ids.extend(result.data)
+        return call
+
+    async def scenario(name: str, calls: List[Callable[[], Awaitable]]):
+        latencies, errors, wall = await run_load(calls, args.concurrency)
+        results.append(summarize("mcp", name, latencies, errors, wall))
+
+    try:
+        await scenario("cold_search", [search(topic, args.max_results, keep_ids=True) for topic in topics])
+        await scenario("warm_search", [search(topic, args.max_results) for topic in topics])
+        await scenario("large_topic", [search(f"bench {run_id} large {i}", args.large_results)
+                                       for i in range(args.large_topics)])
+        shared = f"bench {run_id} shared topic"
+        await scenario("concurrent_writers",
+                       [search(shared, args.max_results + i % 50) for i in range(args.requests)])
+        ids = paper_ids or ["0000.00000"]
+        await scenario("extract_info", [
+            (lambda paper_id: lambda: call_tool("extract_info", {"paper_id": paper_id}))(ids[i % len(ids)])
+            for i in range(args.requests)
+        ])
+        await scenario("topic_resource", [
+            (lambda topic: lambda: read_resource(f"papers://{topic.lower().replace(' ', '_')}"))(topics[i])
+            for i in range(args.requests)
+        ])
+    finally:
+        for client in clients:
+            await client.__aexit__(None, None, None)
+    return results
+
+
+# ---- host loops ----------------------------------------------------------------
+
+def host_scenario(procs: Processes, host: str, server_url: str, llm_url: str, args, run_id: str) -> List[dict]:
+    env = {
+        "LOG_DIR": os.path.join(procs.workdir, f"host-{host}"),
+        "TRACE_SUMMARY": "0",
+    }
+    if host == "ollama":
+        env.update(OLLAMA_BASE_URL=llm_url, APP_SERVER_URL=server_url, OLLAMA_MODEL="fake")
+    else:
+        env.update(AZURE_OPENAI_ENDPOINT=os.getenv("AZURE_OPENAI_ENDPOINT") or llm_url,
+                   AZURE_OPENAI_API_KEY=os.getenv("AZURE_OPENAI_API_KEY") or "benchmark",
+                   API_VERSION=os.getenv("API_VERSION") or "2024-06-01",
+                   MODEL_NAME=os.getenv("MODEL_NAME") or "fake-gpt")
+        env["MCP_SERVER_URL" if host == "azure-mcp" else "PAPER_SERVER_API"] = server_url
+    report_path = os.path.join(procs.workdir, f"host-{host}.json")
+    proc = procs.start(f"host-{host}", [sys.executable, os.path.join(BENCH_DIR, "host_driver.py"), host,
+                                        "--turns", str(args.host_turns), "--prefix", f"bench {run_id}",
+                                        "--output", report_path], env)
+    status = proc.wait(timeout=args.timeout * args.host_turns + 60)
+    if status != 0 or not os.path.exists(report_path):
+        raise RuntimeError(f"host driver for {host} failed; see {procs.workdir}/host-{host}.log")
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    results = [summarize(f"host-{host}", "chat_turn", report["turn_seconds"], report["errors"],
+                         report["wall_seconds"])]
+    if report.get("first_token_seconds"):
+        results.append(summarize(f"host-{host}", "first_token", report["first_token_seconds"], report["errors"],
+                                 report["wall_seconds"]))
+    return results
+
+
+# ---- reporting -----------------------------------------------------------------
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results: List[dict], baseline_path: str, max_regression: float) -> List[str]:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(item["target"], item["scenario"]): item for item in json.load(f)["results"]}
+    regressions = []
+    for item in results:
+        before = baseline.get((item["target"], item["scenario"]))
+        if not before or not before["p95_ms"]:
+            continue
+        change = item["p95_ms"] / before["p95_ms"] - 1
+        if change > max_regression:
+            regressions.append(f"{item['target']} {item['scenario']}: p95 {before['p95_ms']}ms -> "
+                               f"{item['p95_ms']}ms (+{change:.0%})")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the benchmark scenarios and report latency percentiles")
+    parser.add_argument("--suite", action="append", choices=SUITES,
+                        help="suite to run (repeatable; default: all)")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--max-results", type=int, default=5, help="max_results for ordinary searches")
+    parser.add_argument("--large-results", type=int, default=300, help="max_results for large-topic searches")
+    parser.add_argument("--large-topics", type=int, default=5, help="searches in the large-topic scenarios")
+    parser.add_argument("--batch-topics", type=int, default=10, help="topics per batch request")
+    parser.add_argument("--host-turns", type=int, default=20, help="chat turns per host loop")
+    parser.add_argument("--store", default=os.getenv("PAPER_STORE", "json"), help="PAPER_STORE for the servers")
+    parser.add_argument("--arxiv-latency-ms", type=float, default=50)
+    parser.add_argument("--arxiv-total-results", type=int, default=1000)
+    parser.add_argument("--arxiv-rate", type=float, default=1000.0,
+                        help="ARXIV_RATE for the servers (0.34 reproduces the real rate limit)")
+    parser.add_argument("--llm-latency-ms", type=float, default=100)
+    parser.add_argument("--token-delay-ms", type=float, default=5)
+    parser.add_argument("--reply-tokens", type=int, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="share of fake upstream requests that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare p95 latencies against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed p95 growth, e.g. 0.25 = 25%%")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep server logs and data after the run")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    suites = args.suite or list(SUITES)
+    run_id = f"{random.Random(args.seed).randrange(16 ** 6):06x}{os.getpid() % 1000:03d}"
+    workdir = tempfile.mkdtemp(prefix="paper-bench-")
+    procs = Processes(workdir)
+    results: List[dict] = []
+    print(f"Benchmark run {run_id} (workdir {workdir})", file=sys.stderr)
+
+    try:
+        arxiv_url = (os.getenv("ARXIV_API_URL") or "").rsplit("/api/query", 1)[0] or start_fake(procs, "arxiv", args)
+        servers: Dict[str, str] = {}
+
+        def server(target: str) -> str:
+            if target not in servers:
+                servers[target] = start_server(procs, target, arxiv_url, args)
+            return servers[target]
+
+        if "app" in suites:
+            for target in ("ollama-app", "azure-app"):
+                results += asyncio.run(app_scenarios(target, server(target), args, run_id))
+        if "mcp" in suites:
+            results += asyncio.run(mcp_scenarios(server("mcp"), args, run_id))
+        if "hosts" in suites:
+            ollama_url = os.getenv("OLLAMA_BASE_URL") or start_fake(procs, "ollama", args)
+            openai_url = os.getenv("AZURE_OPENAI_ENDPOINT") or start_fake(procs, "openai", args)
+            for host, target in HOSTS.items():
+                llm_url = ollama_url if host == "ollama" else openai_url
+                results += host_scenario(procs, host, server(target), llm_url, args, run_id)
+    finally:
+        procs.stop()
+
+    report = {
+        "meta": {
+            "run_id": run_id,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("output", "baseline", "keep_workdir")},
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if not args.keep_workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
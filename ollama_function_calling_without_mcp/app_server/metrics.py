@@ -0,0 +1,204 @@
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+from anyio import to_thread
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label set."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with sum and count, per label set."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time of a block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Value read at scrape time from an existing counter or size, so hot paths
+    that already keep their own numbers (cache hits, queue sizes) pay nothing.
+    `fn` returns a number, or {label values tuple: number} when labelled.
+    """
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Union[float, Dict[LabelValues, float]]],
+                 metric_type: str = "gauge", labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.type = metric_type
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.warning("Metric %s could not be read: %s", self.name, e)
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(number)}"
+                for key, number in sorted(value.items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format. Call it from
+        the event loop thread, where the threadpool gauges can be read.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge_callback(name: str, documentation: str, fn: Callable, labelnames: Sequence[str] = ()) -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric(name, documentation, fn, "gauge", labelnames))
+
+
+def counter_callback(name: str, documentation: str, fn: Callable, labelnames: Sequence[str] = ()) -> CallbackMetric:
+    return REGISTRY.register(CallbackMetric(name, documentation, fn, "counter", labelnames))
+
+
+# Request metrics shared by the FastAPI routes and the MCP tools
+REQUESTS = counter("app_requests_total", "Requests handled, by tool (route or MCP tool) and status", ("tool", "status"))
+REQUEST_SECONDS = histogram("app_request_seconds", "Request latency in seconds, by tool", ("tool",))
+
+
+def _threadpool_stats():
+    # Must run on the event loop thread (anyio keeps the limiter per loop)
+    return to_thread.current_default_thread_limiter().statistics()
+
+
+gauge_callback("threadpool_size", "Worker threads available for offloaded blocking calls",
+               lambda: to_thread.current_default_thread_limiter().total_tokens)
+gauge_callback("threadpool_busy", "Worker threads currently running blocking calls",
+               lambda: _threadpool_stats().borrowed_tokens)
+gauge_callback("threadpool_queue_depth", "Blocking calls waiting for a free worker thread",
+               lambda: _threadpool_stats().tasks_waiting)
@@ -0,0 +1,859 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from paper_index import PaperIndex, PAPERS_FILE, dump_with_offsets
+from tracing import traced
+from metrics import BYTES_BUCKETS, histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process coalescing still applies
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Log-structured store (PAPER_STORE=log)
+LOG_SEGMENT_BYTES = int(os.getenv("LOG_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+LOG_MAX_SEGMENTS = int(os.getenv("LOG_MAX_SEGMENTS", "8"))
+LOG_COMPACT_DEAD_RATIO = float(os.getenv("LOG_COMPACT_DEAD_RATIO", "0.5"))
+LOG_COMPACT_INTERVAL = float(os.getenv("LOG_COMPACT_INTERVAL", "60"))  # seconds
+
+STORE_SECONDS = histogram("store_operation_seconds", "Paper store read/write latency in seconds", ("op",))
+STORE_BYTES_WRITTEN = histogram("store_bytes_written", "Bytes written per save_papers call, by backend",
+                                ("backend",), buckets=BYTES_BUCKETS)
+
+
+def instrumented(op: str) -> Callable:
+    """Trace a store method as a "store.<op>" span and record its latency."""
+    def decorator(fn: Callable) -> Callable:
+        fn = traced(f"store.{op}")(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with STORE_SECONDS.time(op=op):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def topic_dir_name(topic: str) -> str:
+    """Normalize a topic the same way for every backend ("Agentic RAG" -> "agentic_rag")."""
+    return topic.lower().replace(" ", "_")
+
+
+class TopicStats(NamedTuple):
+    count: int
+    updated: Optional[float]  # unix time of the last change, if the backend knows it
+    version: Hashable  # same token as topic_version()
+
+
+class PaperStore:
+    """
+    Storage interface for paper metadata.
+
+    Papers are dicts with title, authors, summary, pdf_url and published,
+    keyed by their arXiv short ID and grouped under (normalized) topics.
+    Listeners registered with add_listener() are called with
+    (topic, papers) after every save that changed something.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[str, Dict[str, dict]], None]] = []
+
+    def add_listener(self, callback: Callable[[str, Dict[str, dict]], None]):
+        """Call `callback(topic, papers)` after each successful save."""
+        self._listeners.append(callback)
+
+    def _notify(self, topic: str, papers: Dict[str, dict]):
+        for callback in self._listeners:
+            try:
+                callback(topic, papers)
+            except Exception:
+                logger.exception("Paper store listener %r failed", callback)
+
+    def save_papers(self, topic: str, papers: Dict[str, dict]):
+        """Insert or update papers and record them under a topic."""
+        raise NotImplementedError
+
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        """Return one paper's info, or None if it was never stored."""
+        raise NotImplementedError
+
+    def get_papers(self, paper_ids: List[str]) -> Dict[str, dict]:
+        """Return {paper_id: info} for the given IDs that are stored (unknown IDs are left out)."""
+        papers = {}
+        for paper_id in paper_ids:
+            paper_info = self.get_paper(paper_id)
+            if paper_info is not None:
+                papers[paper_id] = paper_info
+        return papers
+
+    def get_topic_papers(self, topic: str) -> Dict[str, dict]:
+        """Return all papers stored under a topic, in insertion order."""
+        raise NotImplementedError
+
+    def list_topics(self) -> List[str]:
+        """Return the names of all topics that have stored papers."""
+        raise NotImplementedError
+
+    def topic_version(self, topic: str) -> Optional[Hashable]:
+        """Cheap token that changes whenever the topic's papers change (None if no such topic)."""
+        raise NotImplementedError
+
+    def topic_stats(self, topic: str) -> Optional[TopicStats]:
+        """Paper count, last update and version of a topic (None if no such topic)."""
+        version = self.topic_version(topic)
+        if version is None:
+            return None
+        return TopicStats(len(self.get_topic_papers(topic)), None, version)
+
+    def catalog_version(self) -> Optional[Hashable]:
+        """
+        Cheap token that changes when topics are added (or, for some backends,
+        when any topic changes). None if the backend has no such token.
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class _TopicWriter:
+    """Updates waiting to be written to one topic's file, plus who is writing them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending: Dict[str, dict] = {}
+        self.future: Optional[Future] = None
+        self.writing = False
+
+
+class JsonPaperStore(PaperStore):
+    """
+    One papers_info.json file per topic directory (the original layout).
+
+    Concurrent saves to the same topic are coalesced: the first caller becomes
+    the topic's writer and keeps writing until no updates are queued, while
+    later callers just merge their papers into the next batch and wait for it.
+    Each batch is one read-modify-write under an advisory file lock (so other
+    processes are serialized too), written compactly to a temp file, fsynced
+    and renamed over the old file. Readers therefore always see a complete file.
+    """
+
+    def __init__(self, paper_dir: str):
+        super().__init__()
+        self.paper_dir = paper_dir
+        self.index = PaperIndex(paper_dir)
+        self.index.rebuild()
+        self._writers_lock = threading.Lock()
+        self._writers: Dict[str, _TopicWriter] = {}
+
+    def get_paper_info_path(self, topic: str) -> str:
+        return os.path.join(self.paper_dir, topic_dir_name(topic), PAPERS_FILE)
+
+    @staticmethod
+    def load_existing_papers(file_path: str) -> dict:
+        try:
+            with open(file_path, "r") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            # Keep the damaged file for inspection instead of silently overwriting it
+            quarantine_path = f"{file_path}.corrupt-{int(time.time())}"
+            os.replace(file_path, quarantine_path)
+            logger.error("Corrupted papers file %s moved to %s: %s", file_path, quarantine_path, e)
+            return {}
+
+    @instrumented("save_papers")
+    def save_papers(self, topic: str, papers: Dict[str, dict]):
+        topic = topic_dir_name(topic)
+        with self._writers_lock:
+            writer = self._writers.setdefault(topic, _TopicWriter())
+        with writer.lock:
+            writer.pending.update(papers)
+            if writer.future is None:
+                writer.future = Future()
+            future = writer.future
+            lead = not writer.writing
+            writer.writing = True
+
+        if lead:
+            self._drain(topic, writer)
+        future.result()
+
+    def _drain(self, topic: str, writer: _TopicWriter):
+        while True:
+            with writer.lock:
+                batch, writer.pending = writer.pending, {}
+                future, writer.future = writer.future, None
+                if future is None:
+                    writer.writing = False
+                    return
+            try:
+                self._write_batch(topic, batch)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    @instrumented("write_batch")
+    def _write_batch(self, topic: str, papers: Dict[str, dict]):
+        file_path = self.get_paper_info_path(topic)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(f"{file_path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            papers_info = self.load_existing_papers(file_path)
+            if all(papers_info.get(paper_id) == info for paper_id, info in papers.items()):
+                # Nothing new (e.g. a repeated, cached search) - skip the rewrite
+                return
+            papers_info.update(papers)
+
+            data, spans = dump_with_offsets(papers_info)
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, "wb") as json_file:
+                json_file.write(data)
+                json_file.flush()
+                os.fsync(json_file.fileno())
+            os.replace(tmp_path, file_path)
+            STORE_BYTES_WRITTEN.observe(len(data), backend="json")
+            self.index.update_topic(topic, data, spans)
+        self._notify(topic, papers)
+
+    @instrumented("get_paper")
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        return self.index.lookup(paper_id)
+
+    @instrumented("get_papers")
+    def get_papers(self, paper_ids: List[str]) -> Dict[str, dict]:
+        return self.index.lookup_many(paper_ids)
+
+    @instrumented("get_topic_papers")
+    def get_topic_papers(self, topic: str) -> Dict[str, dict]:
+        try:
+            with open(self.get_paper_info_path(topic), "r") as json_file:
+                return json.load(json_file)
+        except FileNotFoundError:
+            return {}
+
+    def list_topics(self) -> List[str]:
+        if not os.path.isdir(self.paper_dir):
+            return []
+        return [
+            topic for topic in os.listdir(self.paper_dir)
+            if os.path.isfile(os.path.join(self.paper_dir, topic, PAPERS_FILE))
+        ]
+
+    def topic_version(self, topic: str) -> Optional[Hashable]:
+        try:
+            st = os.stat(self.get_paper_info_path(topic))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def topic_stats(self, topic: str) -> Optional[TopicStats]:
+        version = self.topic_version(topic)
+        if version is None:
+            return None
+        count = self.index.topic_size(topic_dir_name(topic)) or 0
+        return TopicStats(count, version[0] / 1e9, version)
+
+    def catalog_version(self) -> Optional[Hashable]:
+        # New topic directories bump the mtime of paper_dir
+        try:
+            return os.stat(self.paper_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+
+class SqlitePaperStore(PaperStore):
+    """
+    Papers, authors and topic membership as rows in one SQLite database (WAL mode).
+
+    Saves are incremental upserts, so their cost depends on the number of new
+    papers rather than on how many are already stored for the topic.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS papers (
+            paper_id  TEXT PRIMARY KEY,
+            title     TEXT NOT NULL,
+            summary   TEXT NOT NULL,
+            pdf_url   TEXT,
+            published TEXT
+        );
+        CREATE TABLE IF NOT EXISTS authors (
+            paper_id  TEXT NOT NULL REFERENCES papers(paper_id) ON DELETE CASCADE,
+            position  INTEGER NOT NULL,
+            name      TEXT NOT NULL,
+            PRIMARY KEY (paper_id, position)
+        );
+        CREATE TABLE IF NOT EXISTS topic_papers (
+            topic     TEXT NOT NULL,
+            paper_id  TEXT NOT NULL REFERENCES papers(paper_id) ON DELETE CASCADE,
+            PRIMARY KEY (topic, paper_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_papers_published ON papers(published);
+        CREATE INDEX IF NOT EXISTS idx_topic_papers_paper ON topic_papers(paper_id);
+        CREATE INDEX IF NOT EXISTS idx_authors_name ON authors(name);
+    """
+
+    def __init__(self, db_path: str):
+        super().__init__()
+        self.db_path = db_path
+        self._local = threading.local()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @instrumented("save_papers")
+    def save_papers(self, topic: str, papers: Dict[str, dict]):
+        if not papers:
+            return
+        topic = topic_dir_name(topic)
+        rows = [
+            (paper_id, info["title"], info["summary"], info.get("pdf_url"), info.get("published"))
+            for paper_id, info in papers.items()
+        ]
+        authors = [
+            (paper_id, position, name)
+            for paper_id, info in papers.items()
+            for position, name in enumerate(info.get("authors", []))
+        ]
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                """
+                INSERT INTO papers (paper_id, title, summary, pdf_url, published)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(paper_id) DO UPDATE SET
+                    title = excluded.title,
+                    summary = excluded.summary,
+                    pdf_url = excluded.pdf_url,
+                    published = excluded.published
+                """,
+                rows,
+            )
+            conn.executemany("DELETE FROM authors WHERE paper_id = ?", [(paper_id,) for paper_id in papers])
+            conn.executemany(
+                "INSERT INTO authors (paper_id, position, name) VALUES (?, ?, ?)",
+                authors,
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO topic_papers (topic, paper_id) VALUES (?, ?)",
+                [(topic, paper_id) for paper_id in papers],
+            )
+        # Text handed to SQLite (before page and WAL overhead)
+        STORE_BYTES_WRITTEN.observe(
+            sum(len(value) for row in rows for value in row if isinstance(value, str))
+            + sum(len(name) for _, _, name in authors),
+            backend="sqlite",
+        )
+        self._notify(topic, papers)
+
+    def _rows_to_papers(self, rows, author_rows) -> Dict[str, dict]:
+        papers = {}
+        for paper_id, title, summary, pdf_url, published in rows:
+            papers[paper_id] = {
+                "title": title,
+                "authors": [],
+                "summary": summary,
+                "pdf_url": pdf_url,
+                "published": published,
+            }
+        for paper_id, name in author_rows:
+            if paper_id in papers:
+                papers[paper_id]["authors"].append(name)
+        return papers
+
+    @instrumented("get_paper")
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT paper_id, title, summary, pdf_url, published FROM papers WHERE paper_id = ?",
+            (paper_id,),
+        ).fetchall()
+        if not rows:
+            return None
+        author_rows = conn.execute(
+            "SELECT paper_id, name FROM authors WHERE paper_id = ? ORDER BY position",
+            (paper_id,),
+        ).fetchall()
+        return self._rows_to_papers(rows, author_rows)[paper_id]
+
+    @instrumented("get_papers")
+    def get_papers(self, paper_ids: List[str]) -> Dict[str, dict]:
+        conn = self._conn()
+        papers = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(paper_ids), 500):
+            chunk = paper_ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT paper_id, title, summary, pdf_url, published FROM papers WHERE paper_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            author_rows = conn.execute(
+                f"SELECT paper_id, name FROM authors WHERE paper_id IN ({placeholders}) ORDER BY paper_id, position",
+                chunk,
+            ).fetchall()
+            papers.update(self._rows_to_papers(rows, author_rows))
+        return papers
+
+    @instrumented("get_topic_papers")
+    def get_topic_papers(self, topic: str) -> Dict[str, dict]:
+        topic = topic_dir_name(topic)
+        conn = self._conn()
+        rows = conn.execute(
+            """
+            SELECT p.paper_id, p.title, p.summary, p.pdf_url, p.published
+            FROM topic_papers t JOIN papers p ON p.paper_id = t.paper_id
+            WHERE t.topic = ?
+            ORDER BY t.rowid
+            """,
+            (topic,),
+        ).fetchall()
+        author_rows = conn.execute(
+            """
+            SELECT a.paper_id, a.name
+            FROM topic_papers t JOIN authors a ON a.paper_id = t.paper_id
+            WHERE t.topic = ?
+            ORDER BY a.paper_id, a.position
+            """,
+            (topic,),
+        ).fetchall()
+        return self._rows_to_papers(rows, author_rows)
+
+    def get_papers_published_between(self, start: str, end: str, limit: int = 100) -> Dict[str, dict]:
+        """
+        Return papers with start <= published <= end (ISO dates), newest first.
+        """
+        conn = self._conn()
+        rows = conn.execute(
+            """
+            SELECT paper_id, title, summary, pdf_url, published FROM papers
+            WHERE published BETWEEN ? AND ?
+            ORDER BY published DESC
+            LIMIT ?
+            """,
+            (start, end, limit),
+        ).fetchall()
+        paper_ids = [row[0] for row in rows]
+        author_rows = conn.execute(
+            f"SELECT paper_id, name FROM authors WHERE paper_id IN ({','.join('?' * len(paper_ids))}) "
+            "ORDER BY paper_id, position",
+            paper_ids,
+        ).fetchall() if paper_ids else []
+        return self._rows_to_papers(rows, author_rows)
+
+    def list_topics(self) -> List[str]:
+        rows = self._conn().execute("SELECT DISTINCT topic FROM topic_papers ORDER BY topic").fetchall()
+        return [row[0] for row in rows]
+
+    def topic_version(self, topic: str) -> Optional[Hashable]:
+        # Membership only ever grows, so (count, last rowid) changes on every new paper
+        count, last_rowid = self._conn().execute(
+            "SELECT COUNT(*), MAX(rowid) FROM topic_papers WHERE topic = ?",
+            (topic_dir_name(topic),),
+        ).fetchone()
+        return (count, last_rowid) if count else None
+
+    def topic_stats(self, topic: str) -> Optional[TopicStats]:
+        version = self.topic_version(topic)
+        if version is None:
+            return None
+        return TopicStats(version[0], None, version)
+
+    def catalog_version(self) -> Optional[Hashable]:
+        # Any new membership row, in any topic and from any process, moves this
+        return self._conn().execute("SELECT COUNT(*), MAX(rowid) FROM topic_papers").fetchone()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _LogEntry(NamedTuple):
+    segment: str  # file name inside the topic directory
+    offset: int
+    length: int
+    digest: int  # hash of the stored paper, to skip rewriting unchanged papers
+    seq: int  # store-wide write order (0 for lines written before it was recorded)
+
+
+def _encode_line(paper_id: str, seq: int, info: dict) -> Tuple[bytes, int]:
+    """One log line (without the newline) and the digest of its paper."""
+    paper = json.dumps(info, separators=(",", ":")).encode("utf-8")
+    line = b'{"id":%s,"seq":%d,"paper":%s}' % (json.dumps(paper_id).encode("utf-8"), seq, paper)
+    return line, hash(paper)
+
+
+class LogPaperStore(PaperStore):
+    """
+    Append-only store: each topic is a series of JSONL segments.
+
+    A save appends one line per new or changed paper to the topic's active
+    segment, so its cost depends only on the papers written. An in-memory
+    offset index (rebuilt by scanning the segments at startup) maps every
+    paper to the line holding its latest version, so point reads are one
+    seek. Every line carries a store-wide sequence number, so a paper saved
+    under several topics resolves to its last write after a restart too.
+    A background compactor rewrites topics whose segments are mostly
+    superseded lines (or that have too many segments) into one segment.
+
+    Meant for a single writing process; other processes' appends are not
+    picked up until restart.
+    """
+
+    SEGMENT_PREFIX = "segment_"
+    SEGMENT_SUFFIX = ".jsonl"
+
+    def __init__(self, log_dir: str, segment_bytes: int = LOG_SEGMENT_BYTES,
+                 compact_interval: float = LOG_COMPACT_INTERVAL):
+        super().__init__()
+        self.log_dir = log_dir
+        self.segment_bytes = segment_bytes
+        self._lock = threading.RLock()
+        self._topics: Dict[str, Dict[str, _LogEntry]] = {}  # topic -> paper_id -> latest line
+        self._papers: Dict[str, Tuple[str, _LogEntry]] = {}  # paper_id -> (topic, latest line)
+        self._segments: Dict[str, List[str]] = {}  # topic -> segment files, oldest first
+        self._dead_bytes: Dict[str, int] = {}
+        self._tail: Dict[str, int] = {}  # topic -> size of its active (last) segment
+        self._seq = 0  # last sequence number written
+        self._generation = 0
+        os.makedirs(log_dir, exist_ok=True)
+        self._load()
+
+        self._stop = threading.Event()
+        self._compactor = threading.Thread(target=self._compact_loop, args=(compact_interval,),
+                                           name="log-compactor", daemon=True)
+        self._compactor.start()
+
+    # ---- layout ----------------------------------------------------------
+
+    def _topic_dir(self, topic: str) -> str:
+        return os.path.join(self.log_dir, topic)
+
+    def _segment_name(self, seq: int) -> str:
+        return f"{self.SEGMENT_PREFIX}{seq:08d}{self.SEGMENT_SUFFIX}"
+
+    def _segment_seq(self, name: str) -> int:
+        return int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+
+    def _load(self):
+        for topic in sorted(os.listdir(self.log_dir)):
+            topic_dir = self._topic_dir(topic)
+            if not os.path.isdir(topic_dir):
+                continue
+            segments = sorted(
+                name for name in os.listdir(topic_dir)
+                if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX)
+            )
+            if not segments:
+                continue
+            entries: Dict[str, _LogEntry] = {}
+            dead = 0
+            for segment in segments:
+                segment_dead, size = self._scan_segment(topic, segment, entries)
+                dead += segment_dead
+            self._segments[topic] = segments
+            self._tail[topic] = size
+            self._topics[topic] = entries
+            self._dead_bytes[topic] = dead
+            for paper_id, entry in entries.items():
+                # Replay by write order, not by topic name
+                located = self._papers.get(paper_id)
+                if located is None or entry.seq >= located[1].seq:
+                    self._papers[paper_id] = (topic, entry)
+                self._seq = max(self._seq, entry.seq)
+        logger.info("Log store ready: %d papers across %d topics", len(self._papers), len(self._topics))
+
+    def _scan_segment(self, topic: str, segment: str, entries: Dict[str, _LogEntry]) -> Tuple[int, int]:
+        """
+        Add a segment's lines to `entries`.
+
+        Returns:
+            (bytes of older lines it supersedes, segment size)
+        """
+        dead = 0
+        offset = 0
+        with open(os.path.join(self._topic_dir(topic), segment), "r+b") as f:
+            for line in f:
+                length = len(line)
+                if not line.endswith(b"\n"):
+                    # Torn last line from a crash mid-append: cut it off so the next append starts clean
+                    logger.warning("Truncating torn line at %s/%s:%d", topic, segment, offset)
+                    f.truncate(offset)
+                    break
+                try:
+                    record = json.loads(line)
+                    paper_id = record["id"]
+                    digest = hash(json.dumps(record["paper"], separators=(",", ":")).encode("utf-8"))
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Skipping unreadable line at %s/%s:%d", topic, segment, offset)
+                    dead += length
+                    offset += length
+                    continue
+                previous = entries.get(paper_id)
+                if previous is not None:
+                    dead += previous.length
+                entries[paper_id] = _LogEntry(segment, offset, length, digest, record.get("seq", 0))
+                offset += length
+        return dead, offset
+
+    def _read_line(self, topic: str, entry: _LogEntry) -> dict:
+        with open(os.path.join(self._topic_dir(topic), entry.segment), "rb") as f:
+            f.seek(entry.offset)
+            return json.loads(f.read(entry.length))["paper"]
+
+    # ---- writes ----------------------------------------------------------
+
+    @instrumented("save_papers")
+    def save_papers(self, topic: str, papers: Dict[str, dict]):
+        topic = topic_dir_name(topic)
+        digests = {
+            paper_id: hash(json.dumps(info, separators=(",", ":")).encode("utf-8"))
+            for paper_id, info in papers.items()
+        }
+
+        with self._lock:
+            entries = self._topics.setdefault(topic, {})
+            changed = []
+            for paper_id, info in papers.items():
+                if paper_id in entries and entries[paper_id].digest == digests[paper_id]:
+                    continue
+                self._seq += 1
+                changed.append((paper_id, self._seq, _encode_line(paper_id, self._seq, info)[0]))
+            if not changed:
+                return
+            topic_dir = self._topic_dir(topic)
+            os.makedirs(topic_dir, exist_ok=True)
+            segments = self._segments.setdefault(topic, [])
+            if not segments or self._tail[topic] >= self.segment_bytes:
+                next_seq = self._segment_seq(segments[-1]) + 1 if segments else 1
+                segments.append(self._segment_name(next_seq))
+                self._tail[topic] = 0
+            segment = segments[-1]
+
+            offset = self._tail[topic]
+            data = b"".join(line + b"\n" for _, _, line in changed)
+            with open(os.path.join(topic_dir, segment), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            STORE_BYTES_WRITTEN.observe(len(data), backend="log")
+            for paper_id, seq, line in changed:
+                previous = entries.get(paper_id)
+                if previous is not None:
+                    self._dead_bytes[topic] = self._dead_bytes.get(topic, 0) + previous.length
+                entry = _LogEntry(segment, offset, len(line) + 1, digests[paper_id], seq)
+                entries[paper_id] = entry
+                self._papers[paper_id] = (topic, entry)
+                offset += entry.length
+            self._tail[topic] = offset
+            self._generation += 1
+        self._notify(topic, {paper_id: papers[paper_id] for paper_id, _, _ in changed})
+
+    # ---- reads -----------------------------------------------------------
+
+    @instrumented("get_paper")
+    def get_paper(self, paper_id: str) -> Optional[dict]:
+        for _ in range(2):
+            with self._lock:
+                located = self._papers.get(paper_id)
+            if located is None:
+                return None
+            try:
+                return self._read_line(*located)
+            except FileNotFoundError:
+                continue  # compacted away between lookup and read; look up again
+        return None
+
+    @instrumented("get_papers")
+    def get_papers(self, paper_ids: List[str]) -> Dict[str, dict]:
+        papers = {}
+        for paper_id in paper_ids:
+            paper_info = self.get_paper(paper_id)
+            if paper_info is not None:
+                papers[paper_id] = paper_info
+        return papers
+
+    @instrumented("get_topic_papers")
+    def get_topic_papers(self, topic: str) -> Dict[str, dict]:
+        topic = topic_dir_name(topic)
+        with self._lock:
+            # Reading under the lock keeps the compactor from removing segments mid-read
+            entries = self._topics.get(topic, {})
+            by_segment: Dict[str, List[Tuple[str, _LogEntry]]] = {}
+            for paper_id, entry in entries.items():
+                by_segment.setdefault(entry.segment, []).append((paper_id, entry))
+            found = {}
+            for segment, segment_entries in by_segment.items():
+                with open(os.path.join(self._topic_dir(topic), segment), "rb") as f:
+                    for paper_id, entry in segment_entries:
+                        f.seek(entry.offset)
+                        found[paper_id] = json.loads(f.read(entry.length))["paper"]
+            return {paper_id: found[paper_id] for paper_id in entries}
+
+    def list_topics(self) -> List[str]:
+        with self._lock:
+            return [topic for topic, entries in self._topics.items() if entries]
+
+    def topic_version(self, topic: str) -> Optional[Hashable]:
+        topic = topic_dir_name(topic)
+        with self._lock:
+            entries = self._topics.get(topic)
+            if not entries:
+                return None
+            # Changes on every append and every compaction, and survives restarts
+            return (self._segments[topic][-1], self._tail[topic])
+
+    def topic_stats(self, topic: str) -> Optional[TopicStats]:
+        topic = topic_dir_name(topic)
+        with self._lock:
+            version = self.topic_version(topic)
+            if version is None:
+                return None
+            return TopicStats(len(self._topics[topic]), None, version)
+
+    def catalog_version(self) -> Optional[Hashable]:
+        return self._generation
+
+    # ---- compaction ------------------------------------------------------
+
+    def _needs_compaction(self, topic: str) -> bool:
+        segments = self._segments.get(topic, [])
+        if len(segments) > LOG_MAX_SEGMENTS:
+            return True
+        dead = self._dead_bytes.get(topic, 0)
+        live = sum(entry.length for entry in self._topics.get(topic, {}).values())
+        return dead > 0 and dead / (dead + live) >= LOG_COMPACT_DEAD_RATIO
+
+    @instrumented("compact")
+    def compact(self, topic: str):
+        """Rewrite a topic's live lines into one new segment and drop the old ones."""
+        topic = topic_dir_name(topic)
+        with self._lock:
+            old_segments = list(self._segments.get(topic, []))
+            if not old_segments:
+                return
+            papers = self.get_topic_papers(topic)
+            seqs = {paper_id: entry.seq for paper_id, entry in self._topics[topic].items()}
+            new_segment = self._segment_name(self._segment_seq(old_segments[-1]) + 1)
+            topic_dir = self._topic_dir(topic)
+            tmp_path = os.path.join(topic_dir, f"{new_segment}.tmp")
+
+            entries: Dict[str, _LogEntry] = {}
+            offset = 0
+            with open(tmp_path, "wb") as f:
+                for paper_id, info in papers.items():
+                    # Lines keep their sequence numbers, so compaction does not reorder writes
+                    line, digest = _encode_line(paper_id, seqs[paper_id], info)
+                    f.write(line + b"\n")
+                    entries[paper_id] = _LogEntry(new_segment, offset, len(line) + 1, digest, seqs[paper_id])
+                    offset += len(line) + 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(topic_dir, new_segment))
+
+            self._topics[topic] = entries
+            self._segments[topic] = [new_segment]
+            self._tail[topic] = offset
+            self._dead_bytes[topic] = 0
+            self._generation += 1
+            for paper_id, entry in entries.items():
+                located = self._papers.get(paper_id)
+                if located is None or located[0] == topic:
+                    self._papers[paper_id] = (topic, entry)
+            for segment in old_segments:
+                os.remove(os.path.join(topic_dir, segment))
+        logger.info("Compacted topic %s: %d segments -> 1 (%d papers)", topic, len(old_segments), len(entries))
+
+    def _compact_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            for topic in self.list_topics():
+                try:
+                    with self._lock:
+                        due = self._needs_compaction(topic)
+                    if due:
+                        self.compact(topic)
+                except Exception:
+                    logger.exception("Compaction of topic %s failed", topic)
+
+    def close(self):
+        self._stop.set()
+        self._compactor.join()
+
+
+def migrate_json_to_sqlite(paper_dir: str, db_path: str) -> int:
+    """
+    Copy every topic's papers_info.json under paper_dir into a SQLite store.
+
+    Safe to re-run: papers are upserted, so a second run only refreshes rows.
+
+    Returns:
+        Number of (topic, paper) entries migrated
+    """
+    json_store = JsonPaperStore(paper_dir)
+    sqlite_store = SqlitePaperStore(db_path)
+    migrated = 0
+    for topic in json_store.list_topics():
+        try:
+            papers = json_store.get_topic_papers(topic)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping corrupted topic %s: %s", topic, e)
+            continue
+        sqlite_store.save_papers(topic, papers)
+        migrated += len(papers)
+        logger.info("Migrated %d papers for topic %s", len(papers), topic)
+    sqlite_store.close()
+    return migrated
+
+
+def get_store(paper_dir: str) -> PaperStore:
+    """
+    Build the paper store selected by the PAPER_STORE env var ("json", "sqlite" or "log").
+    """
+    backend = os.getenv("PAPER_STORE", "json").lower()
+    if backend == "json":
+        return JsonPaperStore(paper_dir)
+    if backend == "sqlite":
+        return SqlitePaperStore(os.getenv("PAPER_DB_PATH", os.path.join(paper_dir, "papers.db")))
+    if backend == "log":
+        return LogPaperStore(os.getenv("PAPER_LOG_DIR", os.path.join(paper_dir, ".log_store")))
+    raise ValueError(f"Unknown PAPER_STORE backend: {backend}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paper store utilities")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate = subparsers.add_parser("migrate", help="Copy the JSON topic tree into SQLite")
+    migrate.add_argument("--paper-dir", required=True, help="Directory holding the topic folders")
+    migrate.add_argument("--db", required=True, help="SQLite database file to create or update")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    count = migrate_json_to_sqlite(args.paper_dir, args.db)
+    print(f"Migrated {count} papers into {args.db}")
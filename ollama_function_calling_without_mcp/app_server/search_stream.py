@@ -0,0 +1,110 @@
+import os
+import asyncio
+import logging
+from typing import AsyncIterator, List, Optional, Set
+from anyio import to_thread
+from arxiv_service import arxiv_service, IncompleteSearch
+from paper_store import PaperStore
+from search_cache import search_cache
+
+logger = logging.getLogger(__name__)
+
+# Size of the first arXiv page of a streamed search (later pages use ARXIV_PAGE_SIZE)
+STREAM_FIRST_PAGE = int(os.getenv("STREAM_FIRST_PAGE", "10"))
+# Papers buffered before each store write while a stream runs
+STREAM_PERSIST_BATCH = int(os.getenv("STREAM_PERSIST_BATCH", "50"))
+
+# Keeps background producers referenced until they finish
+_running: Set[asyncio.Task] = set()
+
+
+class SearchStream:
+    """
+    One arXiv search whose pages are fetched and persisted by a background task.
+
+    Consumers iterate over lists of paper IDs as pages land. The producer does
+    not depend on anyone consuming: if the caller returns early or disconnects,
+    the remaining pages are still fetched and saved. IDs are only handed out
+    once their papers are saved, so extract_info finds every ID it is given.
+    The first page is saved on its own so it can be returned right away; later
+    pages are saved (and handed out) in batches of at least STREAM_PERSIST_BATCH
+    papers. When the search runs to completion, the full result list goes into
+    the search cache.
+    """
+
+    def __init__(self, store: PaperStore, topic: str, max_results: int, sort: str = "relevance",
+                 first_page: int = STREAM_FIRST_PAGE, persist_batch: int = STREAM_PERSIST_BATCH):
+        self.store = store
+        self.topic = topic
+        self.max_results = max_results
+        self.sort = sort
+        self.first_page = first_page
+        self.persist_batch = persist_batch
+        self.fetched = 0
+        self._queue: "asyncio.Queue[object]" = asyncio.Queue()
+        self._task = asyncio.create_task(self._produce())
+        _running.add(self._task)
+        self._task.add_done_callback(_running.discard)
+
+    async def _save(self, papers: dict):
+        if papers:
+            await to_thread.run_sync(self.store.save_papers, self.topic, papers)
+
+    async def _publish(self, papers: dict):
+        await self._save(papers)
+        if papers:
+            self._queue.put_nowait(list(papers))
+
+    async def _produce(self):
+        try:
+            cached = search_cache.get(self.topic, self.max_results, self.sort)
+            if cached is not None:
+                await self._save(dict(cached))
+                self.fetched = len(cached)
+                self._queue.put_nowait([paper_id for paper_id, _ in cached])
+                return
+
+            results = []
+            buffered = {}
+            complete = True
+            try:
+                async for page in arxiv_service.iter_pages_async(self.topic, self.max_results, self.sort,
+                                                                 first_page=self.first_page):
+                    results.extend(page)
+                    buffered.update(page)
+                    self.fetched = len(results)
+                    if len(results) == len(page) or len(buffered) >= self.persist_batch:
+                        await self._publish(buffered)
+                        buffered = {}
+            except IncompleteSearch as e:
+                # Keep what arrived, but a short result list must not be cached as final
+                logger.warning("Streamed search for %r stopped early: %s", self.topic, e)
+                complete = False
+            await self._publish(buffered)
+            if complete:
+                search_cache.put(self.topic, self.max_results, results, self.sort)
+            logger.info("Streamed search for %r finished: %d papers", self.topic, len(results))
+        except Exception as e:
+            logger.exception("Streamed search for %r failed", self.topic)
+            self._queue.put_nowait(e)
+        finally:
+            self._queue.put_nowait(None)
+
+    async def pages(self) -> AsyncIterator[List[str]]:
+        """Yield paper IDs in batches as they are stored (raises if the search failed)."""
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def first(self) -> Optional[List[str]]:
+        """IDs of the first page (None if the search found nothing); the rest keeps streaming."""
+        async for paper_ids in self.pages():
+            return paper_ids
+        return None
+
+    async def wait(self):
+        await self._task
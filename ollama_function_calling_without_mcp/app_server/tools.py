@@ -1,74 +1,149 @@
-import os
-import json
-import arxiv
-from typing import List
+import asyncio
+from typing import Dict, List, Tuple, Union
+from anyio import to_thread
+from arxiv_service import arxiv_service
+from paper_store import get_store
+from search_cache import search_cache
+from local_search import get_local_index
+from semantic_search import get_embedding_index
+from search_stream import SearchStream
 
 PAPER_DIR = "./paper_data"  # Can be configured as needed
 
+# Storage backend is picked with the PAPER_STORE env var (json | sqlite)
+store = get_store(PAPER_DIR)
 
-def get_paper_info_path(topic: str) -> str:
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
-    return os.path.join(path, "papers_info.json")
+# BM25 index over stored papers, kept up to date on every save
+local_index = get_local_index(store, PAPER_DIR)
 
+# Paper embeddings for similarity search, filled by a background worker
+embedding_index = get_embedding_index(store, PAPER_DIR)
 
-def load_existing_papers(file_path: str) -> dict:
-    try:
-        with open(file_path, "r") as json_file:
-            return json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
 
+async def search_papers_async(topic: str, max_results: int = 5) -> List[str]:
+    """
+    Search for papers on arXiv based on a topic and store their information.
+    The arXiv fetch uses the async HTTP client and the store write runs in a
+    worker thread, so the event loop is never blocked.
+    """
+    results = search_cache.get(topic, max_results)
+    if results is None:
+        results = await arxiv_service.search_async(topic, max_results)
+        search_cache.put(topic, max_results, results)
 
-def save_papers(file_path: str, papers_info: dict):
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    await to_thread.run_sync(store.save_papers, topic, dict(results))
+    return [paper_id for paper_id, _ in results]
 
 
-def search_papers(topic: str, max_results: int = 5) -> List[str]:
+def start_search_stream(topic: str, max_results: int = 5) -> SearchStream:
     """
-    Search for papers on arXiv based on a topic and store their information.
+    Start a streamed search: pages are fetched and stored in the background,
+    and their paper IDs can be consumed as they arrive (must run on the event loop).
+    """
+    return SearchStream(store, topic, max_results)
+
+
+async def search_papers_batch_async(topics: List[str], max_results: int = 5) -> Dict[str, Union[List[str], dict]]:
     """
-    client = arxiv.Client()
-    search = arxiv.Search(
-        query=topic,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.Relevance
+    Run search_papers_async for several topics at once.
+
+    Topics are fetched concurrently (they still share the arXiv rate limit),
+    and a failing topic gets an {"error": ...} entry instead of failing the batch.
+    """
+    topics = list(dict.fromkeys(topics))
+    results = await asyncio.gather(
+        *(search_papers_async(topic, max_results) for topic in topics),
+        return_exceptions=True,
     )
-    results = client.results(search)
-
-    file_path = get_paper_info_path(topic)
-    papers_info = load_existing_papers(file_path)
-    paper_ids = []
-
-    for paper in results:
-        paper_id = paper.get_short_id()
-        paper_ids.append(paper_id)
-        papers_info[paper_id] = {
-            'title': paper.title,
-            'authors': [author.name for author in paper.authors],
-            'summary': paper.summary,
-            'pdf_url': paper.pdf_url,
-            'published': str(paper.published.date())
+    return {
+        topic: {"error": str(result)} if isinstance(result, Exception) else result
+        for topic, result in zip(topics, results)
+    }
+
+
+def _describe_hits(hits: List[Tuple[str, float]]) -> List[dict]:
+    papers = store.get_papers([paper_id for paper_id, _ in hits])
+    return [
+        {
+            "paper_id": paper_id,
+            "title": papers[paper_id]["title"],
+            "published": papers[paper_id]["published"],
+            "score": round(score, 3),
         }
+        for paper_id, score in hits
+        if paper_id in papers
+    ]
+
+
+def search_local(query: str, limit: int = 10) -> List[dict]:
+    """
+    Full-text search over papers already in the store (no arXiv call).
+    """
+    return _describe_hits(local_index.search(query, limit))
+
+
+async def search_local_async(query: str, limit: int = 10) -> List[dict]:
+    """
+    Non-blocking search_local: the index and store reads run in a worker thread.
+    """
+    return await to_thread.run_sync(search_local, query, limit)
 
-    save_papers(file_path, papers_info)
-    return paper_ids
+
+def search_similar(query: str = "", paper_id: str = "", limit: int = 10) -> Union[List[dict], dict]:
+    """
+    Find stored papers similar to a text or to a stored paper by embedding
+    similarity: lexical with the default hashing embedder, semantic with
+    EMBEDDER=sentence-transformers.
+    """
+    if paper_id:
+        hits = embedding_index.similar_to_paper(paper_id, limit)
+        if hits is None:
+            return {"error": f"Paper {paper_id} is not stored or not embedded yet"}
+    elif query:
+        hits = embedding_index.similar_to_text(query, limit)
+    else:
+        return {"error": "Provide either a query or a paper_id"}
+    return _describe_hits(hits)
+
+
+async def search_similar_async(query: str = "", paper_id: str = "", limit: int = 10) -> Union[List[dict], dict]:
+    """
+    Non-blocking search_similar: embedding and scoring run in a worker thread.
+    """
+    return await to_thread.run_sync(search_similar, query, paper_id, limit)
 
 
 def extract_info(paper_id: str) -> dict:
     """
-    Search for information about a specific paper across all topic directories.
+    Look up information about a specific paper in the paper store.
     """
-    for item in os.listdir(PAPER_DIR):
-        topic_dir = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(topic_dir):
-            file_path = os.path.join(topic_dir, "papers_info.json")
-            try:
-                papers_info = load_existing_papers(file_path)
-                if paper_id in papers_info:
-                    return papers_info[paper_id]
-            except Exception:
-                continue
+    paper_info = store.get_paper(paper_id)
+    if paper_info is not None:
+        return paper_info
 
     return {"error": f"No saved information found for paper ID: {paper_id}"}
+
+
+async def extract_info_async(paper_id: str) -> dict:
+    """
+    Non-blocking extract_info: the store read runs in a worker thread.
+    """
+    return await to_thread.run_sync(extract_info, paper_id)
+
+
+def extract_info_batch(paper_ids: List[str]) -> Dict[str, dict]:
+    """
+    Look up several papers in one pass over the paper store.
+    """
+    papers = store.get_papers(list(dict.fromkeys(paper_ids)))
+    return {
+        paper_id: papers.get(paper_id, {"error": f"No saved information found for paper ID: {paper_id}"})
+        for paper_id in paper_ids
+    }
+
+
+async def extract_info_batch_async(paper_ids: List[str]) -> Dict[str, dict]:
+    """
+    Non-blocking extract_info_batch: the store read runs in a worker thread.
+    """
+    return await to_thread.run_sync(extract_info_batch, paper_ids)
@@ -1,14 +1,22 @@
-from llama_client import process_query, ping_ollama
+from llama_client import stream_query, ping_ollama, reset_session
 
 def chat_loop():
-    print("💬 Chat started. Type 'quit' or 'exit' to stop.\n")
+    print("💬 Chat started. Type 'quit' or 'exit' to stop, '/reset' to start a new conversation.\n")
     while True:
         try:
             query = input("You: ").strip()
             if query.lower() in {"quit", "exit"}:
                 print("👋 Exiting chat.")
                 break
-            process_query(query)
+            if query == "/reset":
+                reset_session()
+                print("🧹 Conversation history cleared.\n")
+                continue
+            # Tokens are printed as Ollama streams them
+            print("\n🤖 ", end="", flush=True)
+            for token in stream_query(query):
+                print(token, end="", flush=True)
+            print("\n")
         except Exception as e:
             print(f"\n❌ Error: {e}\n")
 
@@ -0,0 +1,173 @@
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from logger_config import logger
+from tracing import inject, span
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))  # seconds
+HTTP_BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # seconds
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive failures.
+    Open -> half-open after `reset_timeout`, letting one trial call through;
+    its outcome closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit for %s closed again", self.name)
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a half-open trial without an outcome (the caller gave up, not the dependency)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Circuit for %s opened after %s failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+
+class Transport:
+    """
+    Keep-alive HTTP client for one dependency (app server, Ollama, ...).
+
+    Every call gets connect/read timeouts. Idempotent calls are retried with
+    jittered backoff on connection errors, timeouts and retryable statuses.
+    All calls go through a circuit breaker, so a dead dependency fails fast
+    instead of pinning the host.
+    """
+
+    def __init__(self, name: str, base_url: str,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 pool_size: int = HTTP_POOL_SIZE):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker(name)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, idempotent: bool = None, retries: int = None,
+                **kwargs) -> requests.Response:
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retries = self.max_retries if retries is None else retries
+        if not idempotent:
+            retries = 0
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}{path}"
+
+        with span(f"http {method} {path}", kind="client", peer=self.name) as http_span:
+            # Lets the server continue this trace
+            kwargs["headers"] = inject(kwargs.get("headers"))
+            response = self._send(method, url, retries, **kwargs)
+            http_span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    def _send(self, method: str, url: str, retries: int, **kwargs) -> requests.Response:
+        for attempt in range(retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.breaker.record_failure()
+                if attempt == retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("%s %s failed (%s); retry %s/%s in %.2fs", method, url, e, attempt + 1, retries, delay)
+                time.sleep(delay)
+                continue
+            except Exception:
+                # Anything else still ends a half-open trial, or the circuit would never close again
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Ctrl-C and the like say nothing about the dependency
+                self.breaker.release()
+                raise
+
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+                if response.status_code in RETRY_STATUSES and attempt < retries:
+                    delay = backoff_delay(attempt)
+                    logger.warning("%s %s returned %s; retry %s/%s in %.2fs",
+                                   method, url, response.status_code, attempt + 1, retries, delay)
+                    response.close()
+                    time.sleep(delay)
+                    continue
+            else:
+                self.breaker.record_success()
+            return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
@@ -1,10 +1,26 @@
-import requests
+import os
 import json
 from logger_config import logger
+from logging_setup import clip
+from http_transport import Transport
+from ollama_client import OllamaClient
+from result_shaping import shape_result
+from tracing import configure as configure_tracing, span
 
 # 🌐 Endpoints
-OLLAMA_API = "http://host.docker.internal:11434/api/chat"
-APP_SERVER_URL = "http://app_server:8000"
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
+APP_SERVER_URL = os.getenv("APP_SERVER_URL", "http://app_server:8000")
+
+# 🔌 Pooled keep-alive connections with timeouts, retries and a circuit breaker per dependency
+app_server = Transport("app_server", APP_SERVER_URL)
+ollama = OllamaClient(OLLAMA_BASE_URL)
+configure_tracing("ollama-host")
+HTTP_PING_TIMEOUT = float(os.getenv("HTTP_PING_TIMEOUT", "2"))
+# Larger searches return the first streamed page; the server stores the rest in the background
+SEARCH_EARLY_RETURN = int(os.getenv("SEARCH_EARLY_RETURN", "10"))
+
+# 🔁 Agent loop settings
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "5"))
 
 # 🛠 Tool Schema (for Ollama function-calling)
 tools = [
@@ -40,54 +56,171 @@ tools = [
             },
             "required": ["paper_id"]
         }
+    },
+    {
+        "name": "search_local",
+        "description": "Full-text search over papers already stored locally, without calling arXiv.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Keywords to look for in titles, summaries and authors"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of papers to return",
+                    "default": 10
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "search_similar",
+        "description": "Find stored papers similar to a text or to a stored paper (embedding similarity over stored abstracts, no arXiv call).",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Text to find similar papers for"
+                },
+                "paper_id": {
+                    "type": "string",
+                    "description": "ID of a stored paper to find similar papers for (instead of query)"
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of papers to return",
+                    "default": 10
+                }
+            }
+        }
+    },
+    {
+        "name": "search_papers_batch",
+        "description": "Search for papers on arXiv for several topics at once and store their information.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "topics": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The topics to search for"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Maximum number of results to retrieve per topic",
+                    "default": 5
+                }
+            },
+            "required": ["topics"]
+        }
+    },
+    {
+        "name": "extract_info_batch",
+        "description": "Get the stored information for several papers in one call.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "paper_ids": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The IDs of the papers to look for"
+                }
+            },
+            "required": ["paper_ids"]
+        }
     }
 ]
 
 # 🧠 Tool Execution Logic — hits FastAPI backend
 def search_papers(topic: str, max_results: int = 5):
-    logger.info(f"Calling /search_papers with topic={topic}, max_results={max_results}")
-    r = requests.get(f"{APP_SERVER_URL}/search_papers", params={"topic": topic, "max_results": max_results})
+    if max_results > SEARCH_EARLY_RETURN:
+        return search_papers_first_page(topic, max_results)
+    logger.info("Calling /search_papers with topic=%s, max_results=%s", topic, max_results)
+    r = app_server.get("/search_papers", params={"topic": topic, "max_results": max_results})
     r.raise_for_status()
     return r.json()
 
+def search_papers_first_page(topic: str, max_results: int):
+    """Read the first page of /search_papers/stream and hang up; the server keeps storing the rest."""
+    logger.info("Calling /search_papers/stream with topic=%s, max_results=%s", topic, max_results)
+    with app_server.get("/search_papers/stream", params={"topic": topic, "max_results": max_results},
+                        stream=True) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            page = json.loads(line)
+            if "error" in page:
+                raise RuntimeError(page["error"])
+            return page.get("paper_ids", [])
+    return []
+
 def extract_info(paper_id: str):
-    logger.info(f"Calling /extract_info with paper_id={paper_id}")
-    r = requests.get(f"{APP_SERVER_URL}/extract_info", params={"paper_id": paper_id})
+    logger.info("Calling /extract_info with paper_id=%s", paper_id)
+    r = app_server.get("/extract_info", params={"paper_id": paper_id})
+    r.raise_for_status()
+    return r.json()
+
+def search_local(query: str, limit: int = 10):
+    logger.info("Calling /search_local with query=%s, limit=%s", query, limit)
+    r = app_server.get("/search_local", params={"query": query, "limit": limit})
+    r.raise_for_status()
+    return r.json()
+
+def search_similar(query: str = "", paper_id: str = "", limit: int = 10):
+    logger.info("Calling /search_similar with query=%s, paper_id=%s, limit=%s", query, paper_id, limit)
+    r = app_server.get("/search_similar", params={"query": query, "paper_id": paper_id, "limit": limit})
+    r.raise_for_status()
+    return r.json()
+
+def search_papers_batch(topics: list, max_results: int = 5):
+    logger.info("Calling POST /search_papers with topics=%s, max_results=%s", topics, max_results)
+    # Re-running a search only upserts the same papers, so retries are safe
+    r = app_server.post("/search_papers", json={"topics": topics, "max_results": max_results}, idempotent=True)
+    r.raise_for_status()
+    return r.json()
+
+def extract_info_batch(paper_ids: list):
+    logger.info("Calling POST /extract_info with %s paper IDs", len(paper_ids))
+    r = app_server.post("/extract_info", json={"paper_ids": paper_ids}, idempotent=True)
     r.raise_for_status()
     return r.json()
 
 mapping_tool_function = {
     "search_papers": search_papers,
-    "extract_info": extract_info
+    "extract_info": extract_info,
+    "search_papers_batch": search_papers_batch,
+    "extract_info_batch": extract_info_batch,
+    "search_local": search_local,
+    "search_similar": search_similar
 }
 
 def execute_tool(tool_name, tool_args):
-    logger.info(f"Executing tool: {tool_name} with args: {tool_args}")
+    logger.info("Executing tool: %s with args: %s", tool_name, tool_args)
     try:
-        result = mapping_tool_function[tool_name](**tool_args)
-
-        if result is None:
-            return "The operation completed but didn't return any results."
-
-        elif isinstance(result, list):
-            return ', '.join([str(r) for r in result])
-
-        elif isinstance(result, dict):
-            return json.dumps(result, indent=2)
+        with span(f"tool {tool_name}"):
+            result = mapping_tool_function[tool_name](**tool_args)
 
-        return str(result)
+        # Minified, projected JSON keeps the tool message small
+        shaped = shape_result(result)
+        logger.info("✂️ %s result: %s tokens (%s saved)", tool_name, shaped.tokens, shaped.saved)
+        return shaped.text
 
     except Exception as e:
-        logger.exception(f"Tool execution failed for {tool_name}")
-        return {"error": f"Execution failed: {str(e)}"}
+        logger.exception("Tool execution failed for %s", tool_name)
+        # Keep function message content a string so the stored history stays valid
+        return json.dumps({"error": f"Execution failed: {str(e)}"})
 
 
 # ✅ Check if Ollama is up
 def ping_ollama():
     try:
-        response = requests.get("http://host.docker.internal:11434/api/tags")
-        is_up = response.status_code == 200
-        logger.info(f"Ollama health check: {'✅ UP' if is_up else '❌ DOWN'}")
+        is_up = ollama.ping(HTTP_PING_TIMEOUT)
+        logger.info("Ollama health check: %s", "✅ UP" if is_up else "❌ DOWN")
         return is_up
     except Exception as e:
         logger.exception("Failed to ping Ollama")
@@ -95,68 +228,100 @@ def ping_ollama():
 
 
 # 🧠 Main LLM send logic — with function_call capture
-def send_to_ollama(messages):
-    logger.info(f"Sending to Ollama. Last user message: {messages[-1]}")
-    response = requests.post(
-        OLLAMA_API,
-        json={
-            "model": "gemma:7b",
-            "messages": messages,
-            "functions": tools,
-            "stream": True
-        }
+def stream_to_ollama(messages, allow_functions=True):
+    """Start a streamed reply; iterate it for tokens, then call result() for the message."""
+    logger.info("Sending to Ollama. Last user message: %s", clip(messages[-1]))
+    return ollama.chat_stream(messages, tools if allow_functions else None)
+
+
+def finish_ollama_stream(stream):
+    result = stream.result()
+    # Low prompt_eval_count on later turns means Ollama reused its prompt cache
+    logger.info("Ollama stats: prompt_eval_count=%s, eval_count=%s",
+                stream.stats.get("prompt_eval_count"), stream.stats.get("eval_count"))
+    logger.info("Ollama final message: %s", clip(result["message"]["content"]))
+    if "function_call" in result:
+        logger.info("Function call requested: %s", result["function_call"])
+    return result
+
+
+def send_to_ollama(messages, allow_functions=True):
+    return finish_ollama_stream(stream_to_ollama(messages, allow_functions))
+
+
+# 💬 Per-session conversation history
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": (
+        "You are a helpful AI assistant with access to tools."
+        "Whenever a query can benefit from using a function (like searching papers or extracting info), "
+        "you MUST call the appropriate function instead of answering directly."
+        "Please compulsorily use the tools at your displosal and ensure you activate function call"
     )
-    logger.info(f"Actual response from Ollama: {response}")
+}
 
-    full_message = {"role": "assistant", "content": ""}
-    function_call = None
+sessions = {}
 
-    for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line.decode("utf-8"))
-            logger.debug(f"Ollama stream chunk: {chunk}")
+def get_history(session_id="default"):
+    """
+    History is only ever appended to, so each request shares its prefix with the
+    previous one and Ollama can reuse the already-evaluated prompt.
+    """
+    if session_id not in sessions:
+        sessions[session_id] = [SYSTEM_MESSAGE]
+    return sessions[session_id]
 
-            if "message" in chunk:
-                full_message["content"] += chunk["message"].get("content", "")
+def reset_session(session_id="default"):
+    sessions.pop(session_id, None)
 
-            if "function_call" in chunk:
-                function_call = chunk["function_call"]
 
-            if chunk.get("done"):
-                break
+# 🔁 Full query lifecycle — up to MAX_TOOL_ROUNDS tool calls per query
+def stream_query(query, session_id="default"):
+    """
+    Answer a query, yielding reply tokens as Ollama streams them.
+    Tool calls run between model rounds; every round's text is yielded.
+    If the turn fails, the history is left as it was before the query.
+    """
+    # One trace per query; its flame summary shows where the time went
+    with span("chat_turn", summary=True):
+        logger.info("User query: %s", query)
+        history = get_history(session_id)
+        start = len(history)
+        history.append({"role": "user", "content": query})
+        try:
+            yield from _answer(history)
+        except BaseException:
+            # A dangling user message or function call would confuse every later turn
+            del history[start:]
+            raise
 
-    logger.info(f"Ollama final message: {full_message['content']}")
-    result = {"message": full_message}
-    if function_call:
-        logger.info(f"Function call requested: {function_call}")
-        result["function_call"] = function_call
-    return result
 
+def _answer(history):
+    for tool_round in range(MAX_TOOL_ROUNDS):
+        stream = stream_to_ollama(history)
+        yield from stream
+        response = finish_ollama_stream(stream)
+        history.append(response["message"])
 
-# 🔁 Full query lifecycle
-def process_query(query):
-    logger.info(f"User query: {query}")
-    system_message = {
-        "role": "system",
-        "content": (
-            "You are a helpful AI assistant with access to tools."
-            "Whenever a query can benefit from using a function (like searching papers or extracting info), "
-            "you MUST call the appropriate function instead of answering directly."
-            "Please compulsorily use the tools at your displosal and ensure you activate function call"
-        )
-    }
-    history = [system_message] + [{"role": "user", "content": query}]
-    response = send_to_ollama(history)
+        if "function_call" not in response:
+            logger.info("No further function call after %s tool round(s).", tool_round)
+            return
 
-    if "function_call" in response:
         func = response["function_call"]
-        logger.info(f"Function called: {func['name']} with args: {func['arguments']}")
+        logger.info("Function called (round %s): %s with args: %s",
+                    tool_round + 1, func["name"], func["arguments"])
         tool_result = execute_tool(func["name"], func["arguments"])
         history.append({"role": "function", "name": func["name"], "content": tool_result})
 
-        final_response = send_to_ollama(history)
-        logger.info(f"Final assistant message: {final_response['message']['content']}")
-        print("\n🤖", final_response["message"]["content"])
-    else:
-        logger.info("No function call; direct LLM response.")
-        print("\n🤖", response["message"]["content"])
+    # Tool budget used up: ask for an answer from what has been gathered so far
+    logger.info("Reached MAX_TOOL_ROUNDS=%s; requesting final answer without functions.", MAX_TOOL_ROUNDS)
+    stream = stream_to_ollama(history, allow_functions=False)
+    yield from stream
+    history.append(finish_ollama_stream(stream)["message"])
+
+
+def process_query(query, session_id="default"):
+    print("\n🤖 ", end="", flush=True)
+    for token in stream_query(query, session_id):
+        print(token, end="", flush=True)
+    print()
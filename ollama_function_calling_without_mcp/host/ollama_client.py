@@ -0,0 +1,167 @@
+import os
+import json
+import logging
+from typing import Iterator, List, Optional
+import httpx
+from logger_config import logger
+from http_transport import CircuitBreaker, CircuitOpenError, HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE
+from tracing import inject, span
+
+# orjson parses stream chunks several times faster; the stdlib parser is the fallback
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# HTTP/2 needs the optional h2 package (and a server that speaks it, i.e. TLS in front of Ollama)
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma:7b")
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+# Keep the model (and its prompt cache) loaded between turns
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+
+def iter_ndjson(chunks: Iterator[bytes]) -> Iterator[dict]:
+    """Split a byte stream into JSON objects, one per line, without decoding to str first."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            if end > start:
+                yield _loads(bytes(buffer[start:end]))
+            start = end + 1
+        del buffer[:start]
+    if buffer.strip():
+        yield _loads(bytes(buffer))
+
+
+class ChatStream:
+    """
+    One streamed /api/chat reply.
+
+    Iterating yields content tokens as they arrive; the parts are kept in a
+    list and joined once. After the stream ends, result() returns the same
+    {"message": ..., "function_call": ...} dict that send_to_ollama always
+    returned (result() drains the stream first if nobody iterated it).
+    """
+
+    def __init__(self, client: "OllamaClient", payload: dict):
+        self._client = client
+        self._payload = payload
+        self._parts: List[str] = []
+        self._started = False
+        self.done = False
+        self.function_call: Optional[dict] = None
+        self.stats: dict = {}
+
+    def __iter__(self) -> Iterator[str]:
+        if self._started:
+            raise RuntimeError("A chat stream can only be iterated once")
+        self._started = True
+        debug = logger.isEnabledFor(logging.DEBUG)
+        breaker = self._client.breaker
+        with span("llm.chat", kind="client", model=self._payload["model"]) as llm_span:
+            try:
+                with self._client.http.stream("POST", "/api/chat", json=self._payload,
+                                              headers=inject()) as response:
+                    response.raise_for_status()
+                    for chunk in iter_ndjson(response.iter_bytes()):
+                        if debug:
+                            logger.debug("Ollama stream chunk: %s", chunk)
+                        message = chunk.get("message")
+                        if message:
+                            token = message.get("content")
+                            if token:
+                                self._parts.append(token)
+                                yield token
+                        if "function_call" in chunk:
+                            self.function_call = chunk["function_call"]
+                        if chunk.get("done"):
+                            self.stats = {key: chunk.get(key) for key in
+                                          ("prompt_eval_count", "eval_count", "total_duration", "eval_duration")}
+                            break
+            except httpx.HTTPStatusError as e:
+                # Same rule as Transport: only 5xx and 429 count against Ollama
+                status = e.response.status_code
+                if status >= 500 or status == 429:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                raise
+            except Exception:
+                # Transport errors, bad chunks: Ollama's fault
+                breaker.record_failure()
+                raise
+            except BaseException:
+                # The consumer stopped reading (GeneratorExit) or Ctrl-C: free a half-open trial, blame no one
+                breaker.release()
+                raise
+            breaker.record_success()
+            llm_span.set_attribute("eval_count", self.stats.get("eval_count") or len(self._parts))
+            self.done = True
+
+    @property
+    def content(self) -> str:
+        return "".join(self._parts)
+
+    def result(self) -> dict:
+        if not self._started:
+            for _ in self:
+                pass
+        result = {"message": {"role": "assistant", "content": self.content}}
+        if self.function_call:
+            result["function_call"] = self.function_call
+        return result
+
+
+class OllamaClient:
+    """
+    Persistent httpx connection to Ollama's chat API.
+
+    Uses HTTP/2 when h2 is installed, otherwise a keep-alive HTTP/1.1 pool.
+    Chat calls go through the same kind of circuit breaker as Transport, so
+    a dead Ollama fails fast. Chat requests are never retried.
+    """
+
+    def __init__(self, base_url: str, model: str = OLLAMA_MODEL,
+                 read_timeout: float = OLLAMA_READ_TIMEOUT, keep_alive: str = OLLAMA_KEEP_ALIVE):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.breaker = CircuitBreaker("ollama")
+        self.http = httpx.Client(
+            base_url=base_url.rstrip("/"),
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(read_timeout, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        )
+
+    def chat_stream(self, messages: list, functions: Optional[list] = None) -> ChatStream:
+        """Start a streamed chat completion (the request is sent when iteration starts)."""
+        if not self.breaker.allow():
+            raise CircuitOpenError("ollama is unavailable (circuit open)")
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+        }
+        if functions:
+            payload["functions"] = functions
+        return ChatStream(self, payload)
+
+    def ping(self, timeout: float) -> bool:
+        response = self.http.get("/api/tags", timeout=timeout)
+        return response.status_code == 200
+
+    def close(self):
+        self.http.close()
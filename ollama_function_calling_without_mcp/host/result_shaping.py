@@ -0,0 +1,126 @@
+import os
+import json
+from typing import Any, Callable, NamedTuple, Optional
+
+# Summaries in multi-paper results are cut to this many characters (0 keeps them whole)
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "400"))
+# Comma-separated paper fields sent to the model (empty keeps every field)
+RESULT_FIELDS = [field for field in os.getenv("RESULT_FIELDS", "").split(",") if field]
+
+
+class ShapedResult(NamedTuple):
+    text: str
+    tokens: int
+    raw_tokens: int  # tokens the unshaped result would have used
+
+    @property
+    def saved(self) -> int:
+        return self.raw_tokens - self.tokens
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _parse(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def unwrap(result: Any) -> Any:
+    """
+    Turn an MCP CallToolResult into plain data.
+
+    Structured content is preferred; otherwise text blocks are parsed as
+    JSON where possible and other blocks are reduced to their type and URI.
+    Plain values pass through unchanged.
+    """
+    if not hasattr(result, "content") or not hasattr(result, "is_error"):
+        return result
+
+    blocks = []
+    for block in result.content or []:
+        text = getattr(block, "text", None)
+        if text is not None:
+            blocks.append(_parse(text))
+        else:
+            uri = getattr(block, "uri", None) or getattr(getattr(block, "resource", None), "uri", None)
+            blocks.append({"type": getattr(block, "type", "content"), "uri": str(uri) if uri else None})
+    if result.is_error:
+        return {"error": " ".join(str(block) for block in blocks) or "Tool call failed"}
+
+    structured = getattr(result, "structured_content", None)
+    if structured is not None:
+        # FastMCP wraps non-object return values as {"result": value}
+        value = structured["result"] if set(structured) == {"result"} else structured
+        return _parse(value) if isinstance(value, str) else value
+    if len(blocks) == 1:
+        return blocks[0]
+    return blocks
+
+
+def _is_paper(value: Any) -> bool:
+    return isinstance(value, dict) and "title" in value
+
+
+def _truncate(summary: str, paper_id: Optional[str]) -> str:
+    if not SUMMARY_MAX_CHARS or len(summary) <= SUMMARY_MAX_CHARS or not paper_id:
+        return summary
+    cut = summary.rfind(" ", 0, SUMMARY_MAX_CHARS)
+    cut = cut if cut > SUMMARY_MAX_CHARS // 2 else SUMMARY_MAX_CHARS
+    return f"{summary[:cut].rstrip()}… [+{len(summary) - cut} chars, full text via extract_info({paper_id})]"
+
+
+def _shape_paper(paper: dict, paper_id: Optional[str], truncate: bool) -> dict:
+    shaped = {}
+    for key, value in paper.items():
+        if value in (None, "", [], {}):
+            continue
+        if RESULT_FIELDS and key not in RESULT_FIELDS and key not in ("paper_id", "error"):
+            continue
+        if truncate and key == "summary" and isinstance(value, str):
+            value = _truncate(value, paper.get("paper_id", paper_id))
+        shaped[key] = value
+    return shaped
+
+
+def project(value: Any) -> Any:
+    """
+    Drop empty and unselected paper fields, and cut long summaries when a
+    result holds several papers. A cut summary ends with the extract_info
+    call that returns it in full, and extract_info results are never cut.
+    """
+    if _is_paper(value):
+        return _shape_paper(value, None, truncate=False)
+    if isinstance(value, list):
+        return [_shape_paper(item, None, truncate=True) if _is_paper(item) else item for item in value]
+    if isinstance(value, dict):
+        return {
+            key: _shape_paper(item, key, truncate=True) if _is_paper(item) else item
+            for key, item in value.items()
+        }
+    return value
+
+
+def _baseline(result: Any) -> str:
+    # What the hosts used to send: a repr for MCP results, pretty JSON otherwise
+    if isinstance(result, (dict, list)):
+        return json.dumps(result, indent=2)
+    return str(result)
+
+
+def shape_result(result: Any, count_tokens: Callable[[str], int] = estimate_tokens) -> ShapedResult:
+    """
+    Serialize a tool result for the model: unwrap MCP content, project paper
+    fields and emit minified JSON (strings are passed through as they are).
+    """
+    value = project(unwrap(result))
+    if value is None:
+        text = "The operation completed but didn't return any results."
+    elif isinstance(value, str):
+        text = value
+    else:
+        text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return ShapedResult(text, count_tokens(text), count_tokens(_baseline(result)))
@@ -0,0 +1,322 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import asyncio
+import logging
+import secrets
+import threading
+import functools
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACING = os.getenv("TRACING", "1") == "1"
+# OTLP/JSON export requests, one per line; off unless set (e.g. traces.jsonl).
+# A relative path is taken under LOG_DIR, and the file rotates like the log files.
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# OTLP/HTTP JSON endpoint of a collector, e.g. http://otel-collector:4318/v1/traces
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL", "")
+# Print a flame-style breakdown when a summarized span (a chat turn) ends
+TRACE_SUMMARY = os.getenv("TRACE_SUMMARY", "1") == "1"
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "2"))
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+_SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_service_name = os.getenv("OTEL_SERVICE_NAME", "")
+
+
+def configure(service_name: str):
+    """Name this process in exported spans (OTEL_SERVICE_NAME wins if set)."""
+    global _service_name
+    if not os.getenv("OTEL_SERVICE_NAME"):
+        _service_name = service_name
+
+
+class Span:
+    """One timed operation. Spans started under it share its trace ID."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "error", "summary", "_collected")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str],
+                 attributes: dict, collected: Optional[list]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.summary = False
+        # Finished spans of the local tree, kept by the local root for its summary
+        self._collected = collected
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+class _NoopSpan:
+    name = ""
+    traceparent = None
+    duration_ms = 0.0
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, parent span_id) from a W3C traceparent header, or None if it is missing or malformed."""
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    return (match.group(1), match.group(2)) if match else None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent header value for an outgoing call made from the current span."""
+    active = _current.get()
+    return active.traceparent if active is not None else None
+
+
+def inject(headers: Optional[dict] = None) -> dict:
+    """Return `headers` (or a new dict) with the current traceparent added."""
+    headers = dict(headers or {})
+    traceparent = current_traceparent()
+    if traceparent:
+        headers["traceparent"] = traceparent
+    return headers
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, kind: str = "internal",
+         summary: bool = False, **attributes) -> Iterator[Span]:
+    """
+    Time a block as a span, nested under the current one.
+
+    A span with no local parent starts a new trace, or continues a remote
+    one when `traceparent` (from an incoming request) is given. With
+    `summary=True`, a flame-style breakdown of everything that ran under
+    the span is printed when it ends.
+    """
+    if not TRACING:
+        yield _NOOP
+        return
+    parent = _current.get()
+    if parent is not None:
+        trace_id, parent_id, collected = parent.trace_id, parent.span_id, parent._collected
+    else:
+        remote = parse_traceparent(traceparent)
+        trace_id, parent_id = remote if remote else (secrets.token_hex(16), None)
+        collected = []
+    current = Span(name, kind, trace_id, parent_id, attributes, collected)
+    current.summary = summary
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Ended from another context (an abandoned generator); just restore the parent
+            _current.set(parent)
+        if collected is not None:
+            collected.append(current)
+        exporter.submit(current)
+        if summary and TRACE_SUMMARY:
+            print(flame_summary(current, collected), file=sys.stderr)
+
+
+def traced(name: Optional[str] = None, **attributes) -> Callable:
+    """Decorator form of span() for sync and async functions (a no-op when tracing is off)."""
+    def decorator(fn: Callable) -> Callable:
+        if not TRACING:
+            return fn
+        span_name = name or fn.__qualname__
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """
+    Bind `fn` to a copy of the current context, so work handed to a thread
+    pool stays under the current span. Make one per submitted call.
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def flame_summary(root: Span, spans: List[Span], width: int = 40) -> str:
+    """Indented span tree with durations and bars placed on the root's timeline."""
+    children: Dict[Optional[str], List[Span]] = {}
+    for item in spans:
+        if item is not root and item.trace_id == root.trace_id:
+            children.setdefault(item.parent_id, []).append(item)
+    total_ns = max(root.end_ns - root.start_ns, 1)
+    lines = [f"⏱️ {root.name} {root.duration_ms:.1f} ms (trace {root.trace_id})"]
+
+    def render(node: Span, depth: int):
+        offset = int((node.start_ns - root.start_ns) * width / total_ns)
+        length = max(1, int((node.end_ns - node.start_ns) * width / total_ns))
+        bar = " " * max(0, offset) + "█" * min(length, width - max(0, offset))
+        label = ("  " * depth + node.name)[:48]
+        mark = " ✗" if node.error else ""
+        lines.append(f"  {label:<48} {node.duration_ms:>9.1f} ms |{bar:<{width}}|{mark}")
+        for child in sorted(children.get(node.span_id, []), key=lambda item: item.start_ns):
+            render(child, depth + 1)
+
+    render(root, 0)
+    return "\n".join(lines)
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _otlp_span(item: Span) -> dict:
+    encoded = {
+        "traceId": item.trace_id,
+        "spanId": item.span_id,
+        "name": item.name,
+        "kind": _SPAN_KINDS.get(item.kind, 1),
+        "startTimeUnixNano": str(item.start_ns),
+        "endTimeUnixNano": str(item.end_ns),
+        "attributes": [_attribute(key, value) for key, value in item.attributes.items()],
+        "status": {"code": 2, "message": item.error} if item.error else {"code": 0},
+    }
+    if item.parent_id:
+        encoded["parentSpanId"] = item.parent_id
+    return encoded
+
+
+class _TraceFile(RotatingFileHandler):
+    def handleError(self, record: logging.LogRecord):
+        # Called from emit()'s except block: hand the error to the exporter instead of printing it
+        raise
+
+
+class SpanExporter:
+    """
+    Batches finished spans on a background thread and writes them as OTLP
+    JSON export requests: appended to TRACE_FILE (one request per line,
+    size-rotated) and/or POSTed to TRACE_EXPORT_URL. Callers never block on
+    export.
+    """
+
+    def __init__(self, path: str = TRACE_FILE, url: str = TRACE_EXPORT_URL):
+        self.path = os.path.join(os.getenv("LOG_DIR", ""), path) if path else ""
+        self.url = url
+        self._file: Optional[_TraceFile] = None
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._warned = False
+
+    def submit(self, item: Span):
+        if not self.path and not self.url:
+            return
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+        self._queue.put(item)
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                item = self._queue.get(timeout=TRACE_FLUSH_SECONDS)
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= TRACE_BATCH_SIZE:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                item = ...
+            if batch:
+                self._export(batch)
+            if item is None:
+                return
+
+    def _export(self, batch: List[Span]):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", _service_name or "unknown_service")]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [_otlp_span(item) for item in batch]}],
+        }]}
+        body = json.dumps(request, separators=(",", ":"))
+        try:
+            if self.path:
+                if self._file is None:
+                    self._file = _TraceFile(self.path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT,
+                                            encoding="utf-8", delay=True)
+                self._file.emit(logging.makeLogRecord({"msg": body}))
+            if self.url:
+                post = urllib.request.Request(self.url, data=body.encode("utf-8"),
+                                              headers={"Content-Type": "application/json"})
+                urllib.request.urlopen(post, timeout=TRACE_FLUSH_SECONDS).close()
+        except Exception as e:
+            if not self._warned:
+                logger.warning("Span export failed (further failures are not logged): %s", e)
+                self._warned = True
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        if self._file is not None:
+            self._file.close()
+
+
+exporter = SpanExporter()